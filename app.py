@@ -4,14 +4,36 @@ Business Calculator - Web Application
 Calculate break-even, profit margins, and business analytics.
 """
 
-from flask import Flask, render_template_string, request, redirect, url_for
-from calculator import BusinessCalculator
-from storage import load_calculations, save_calculations, generate_id
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, url_for, jsonify, g
+from markupsafe import Markup
+from calculator import calculate as run_calculation, content_hash, parse_form, parse_row, DEFAULT_MARGINS, DEFAULT_MARKUPS
+from recalc import recalculate
+from jobs import JobQueue, JobQueueFull, FINISHED_STATES
+from storage import (load_calculations, apply_change, add_calculations, duplicate_count,
+                     dedupe_calculations, generate_id, validate_workspace, list_workspaces)
+from fragments import FragmentCache
+from search import SearchIndexes, DEFAULT_LIMIT, MAX_LIMIT, MODES
+import profiler
+from profiler import phase
+import gc
+import importlib
 import json
-
-app = Flask(__name__)
-
-@app.template_filter('money')
+import math
+import operator
+import os
+import time
+
+# Every route and hook lives on this blueprint; create_app() builds an app
+# around it. The caches, search indexes and job queue below belong to the
+# process and are shared by every app it creates.
+routes = Blueprint('calculator', __name__)
+job_queue = JobQueue()
+history_fragments = FragmentCache()
+search_indexes = SearchIndexes()
+# Rendered break-even SVGs, keyed by a hash of their inputs
+chart_cache = FragmentCache(max_entries=1000)
+
+@routes.app_template_filter('money')
 def money_filter(value):
     """Format number with commas and 2 decimal places."""
     return "{:,.2f}".format(value)
@@ -399,6 +421,14 @@ HTML_TEMPLATE = '''
         .diff-negative { color: #ff4466; }
         .diff-neutral { color: #888; }
 
+        .live-preview {
+            margin-top: 18px;
+            color: #888;
+            font-size: 0.9em;
+        }
+
+        .live-preview strong { color: #00d4ff; }
+
         @media (max-width: 768px) {
             .form-grid { grid-template-columns: 1fr 1fr; }
             .results-grid { grid-template-columns: 1fr 1fr; }
@@ -409,6 +439,7 @@ HTML_TEMPLATE = '''
     <div class="container">
         <h1>Business Calculator</h1>
         <p class="subtitle">Break-even analysis, profit margins & cost management</p>
+        {% if g.workspace != 'default' %}<p class="subtitle" style="margin-top: -25px; font-size: 0.9em;">Workspace: {{ g.workspace }}</p>{% endif %}
 
         <form method="POST" action="/calculate" class="card">
             <div class="card-header">
@@ -486,8 +517,56 @@ HTML_TEMPLATE = '''
                 <button type="submit" class="btn btn-primary">Calculate</button>
                 <button type="reset" class="btn btn-secondary">Clear</button>
             </div>
+            <div class="live-preview" id="livePreview"></div>
         </form>
 
+        <script>
+        (function() {
+            var form = document.querySelector('form[action="/calculate"]');
+            var preview = document.getElementById('livePreview');
+            var state = {};
+
+            function money(value) {
+                if (value === null) return '-';
+                return '$' + value.toLocaleString(undefined, {minimumFractionDigits: 2, maximumFractionDigits: 2});
+            }
+
+            // Every request carries all current inputs, so a response never
+            // misses an edit made while an earlier one was in flight, and
+            // only the newest request's response is shown
+            var latest = 0;
+
+            function inputs() {
+                var values = {};
+                form.querySelectorAll('input[type="number"]').forEach(function(input) {
+                    values[input.name] = input.value;
+                });
+                return values;
+            }
+
+            function send() {
+                var seq = ++latest;
+                fetch('/recalculate', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({state: state, delta: inputs()})
+                }).then(function(r) { return r.json(); }).then(function(data) {
+                    if (data.error || seq !== latest) return;
+                    state = data.state;
+                    preview.innerHTML = 'Break-even <strong>' + money(state.breakeven_price) + '</strong>' +
+                        ' &middot; Price <strong>' + money(state.effective_price) + '</strong>' +
+                        ' &middot; Profit <strong>' + money(state.gross_profit) + '</strong>' +
+                        ' &middot; Margin <strong>' + (state.profit_margin === null ? '-' : state.profit_margin.toFixed(1) + '%') + '</strong>';
+                });
+            }
+
+            form.querySelectorAll('input[type="number"]').forEach(function(input) {
+                input.addEventListener('input', send);
+            });
+            send();
+        })();
+        </script>
+
         {% if calculations %}
         <div class="card">
             <div class="card-header">
@@ -509,24 +588,7 @@ HTML_TEMPLATE = '''
                         </tr>
                     </thead>
                     <tbody>
-                        {% for calc in calculations %}
-                        <tr>
-                            <td><input type="checkbox" name="compare" value="{{ loop.index0 }}" class="compare-checkbox"></td>
-                            <td class="name">{{ calc.name }}</td>
-                            <td>{{ calc.units }}</td>
-                            <td>${{ calc.cost_per_unit|money }}</td>
-                            <td>${{ calc.selling_price|money }}</td>
-                            <td>{{ "%.1f"|format(calc.profit_margin) }}%</td>
-                            <td class="{{ 'profit-positive' if calc.gross_profit >= 0 else 'profit-negative' }}">
-                                ${{ calc.gross_profit|money }}
-                            </td>
-                            <td>
-                                <form method="POST" action="/delete/{{ loop.index0 }}" style="display:inline;">
-                                    <button type="submit" class="btn btn-danger btn-small">Delete</button>
-                                </form>
-                            </td>
-                        </tr>
-                        {% endfor %}
+{{ history_rows }}
                     </tbody>
                 </table>
                 <div style="margin-top: 15px;">
@@ -664,26 +726,12 @@ HTML_TEMPLATE = '''
                     <span class="margin">Break-even (0% profit)</span>
                     <span class="price">${{ result.breakeven_price|money }} per unit</span>
                 </div>
+                {% for rung in pricing %}
                 <div class="pricing-row">
-                    <span class="margin">20% profit margin</span>
-                    <span class="price">${{ (result.cost_per_unit / 0.8)|money }} per unit</span>
-                </div>
-                <div class="pricing-row">
-                    <span class="margin">30% profit margin</span>
-                    <span class="price">${{ (result.cost_per_unit / 0.7)|money }} per unit</span>
-                </div>
-                <div class="pricing-row">
-                    <span class="margin">40% profit margin</span>
-                    <span class="price">${{ (result.cost_per_unit / 0.6)|money }} per unit</span>
-                </div>
-                <div class="pricing-row">
-                    <span class="margin">50% profit margin</span>
-                    <span class="price">${{ (result.cost_per_unit / 0.5)|money }} per unit</span>
-                </div>
-                <div class="pricing-row">
-                    <span class="margin">60% profit margin</span>
-                    <span class="price">${{ (result.cost_per_unit / 0.4)|money }} per unit</span>
+                    <span class="margin">{{ "%g"|format(rung.target) }}% profit {{ rung.kind }}</span>
+                    <span class="price">${{ rung.price|money }} per unit</span>
                 </div>
+                {% endfor %}
             </div>
 
             {% if scenarios %}
@@ -706,7 +754,7 @@ HTML_TEMPLATE = '''
                         {% for s in scenarios %}
                         <tr class="{{ 'base-row' if s.is_base else '' }}">
                             <td>{{ s.pct }}%{{ ' (current)' if s.is_base else '' }}</td>
-                            <td>{{ "{:,}"|format(s.units) }}</td>
+                            <td>{{ "{:,}".format(s.units) }}</td>
                             <td>${{ s.total_costs|money }}</td>
                             <td>${{ s.cost_per_unit|money }}</td>
                             <td>${{ s.revenue|money }}</td>
@@ -719,6 +767,13 @@ HTML_TEMPLATE = '''
             </div>
             {% endif %}
 
+            {% if chart_url %}
+            <div style="margin-top: 25px;">
+                <h3 style="color: #00d4ff; margin-bottom: 12px;">Break-even Chart</h3>
+                <img src="{{ chart_url }}" alt="Cost, revenue and profit by volume" style="max-width: 100%;">
+            </div>
+            {% endif %}
+
             <div style="margin-top: 20px;">
                 <form method="POST" action="/save" style="display: inline;">
                     <input type="hidden" name="result_data" value='{{ result_json }}'>
@@ -741,7 +796,7 @@ HTML_TEMPLATE = '''
                     <div class="compare-row">
                         <span class="metric-label">{{ d.label }}</span>
                         <span class="metric-value">
-                            {% if d.is_pct %}{{ "%.1f"|format(d.val_a) }}%{% elif d.is_money %}${{ d.val_a|money }}{% else %}{{ "{:,.0f}"|format(d.val_a) }}{% endif %}
+                            {% if d.is_pct %}{{ "%.1f"|format(d.val_a) }}%{% elif d.is_money %}${{ d.val_a|money }}{% else %}{{ "{:,.0f}".format(d.val_a) }}{% endif %}
                         </span>
                     </div>
                     {% endfor %}
@@ -750,7 +805,7 @@ HTML_TEMPLATE = '''
                     <h3>Difference</h3>
                     {% for d in comparison.diffs %}
                     <div class="diff-value {{ 'diff-neutral' if d.is_zero else ('diff-positive' if d.is_positive else 'diff-negative') }}">
-                        {% if d.is_zero %}&mdash;{% elif d.diff > 0 %}+{% endif %}{% if d.is_pct %}{{ "%.1f"|format(d.diff) }}%{% elif d.is_money %}${{ d.diff|money }}{% else %}{{ "{:,.0f}"|format(d.diff) }}{% endif %}
+                        {% if d.is_zero %}&mdash;{% elif d.diff > 0 %}+{% endif %}{% if d.is_pct %}{{ "%.1f"|format(d.diff) }}%{% elif d.is_money %}${{ d.diff|money }}{% else %}{{ "{:,.0f}".format(d.diff) }}{% endif %}
                     </div>
                     {% endfor %}
                 </div>
@@ -760,7 +815,7 @@ HTML_TEMPLATE = '''
                     <div class="compare-row">
                         <span class="metric-label">{{ d.label }}</span>
                         <span class="metric-value">
-                            {% if d.is_pct %}{{ "%.1f"|format(d.val_b) }}%{% elif d.is_money %}${{ d.val_b|money }}{% else %}{{ "{:,.0f}"|format(d.val_b) }}{% endif %}
+                            {% if d.is_pct %}{{ "%.1f"|format(d.val_b) }}%{% elif d.is_money %}${{ d.val_b|money }}{% else %}{{ "{:,.0f}".format(d.val_b) }}{% endif %}
                         </span>
                     </div>
                     {% endfor %}
@@ -773,28 +828,101 @@ HTML_TEMPLATE = '''
 </html>
 '''
 
-@app.route('/')
+# One saved calculation in the history table. The cells are cached per
+# record; the row's position is filled in when the page is assembled.
+HISTORY_ROW_START = '''                        <tr>
+                            <td><input type="checkbox" name="compare" value="%d" class="compare-checkbox"></td>
+'''
+
+HISTORY_ROW_CELLS = '''                            <td class="name">{{ calc.name }}</td>
+                            <td>{{ calc.units }}</td>
+                            <td>${{ calc.cost_per_unit|money }}</td>
+                            <td>${{ calc.selling_price|money }}</td>
+                            <td>{{ "%.1f"|format(calc.profit_margin) }}%</td>
+                            <td class="{{ 'profit-positive' if calc.gross_profit >= 0 else 'profit-negative' }}">
+                                ${{ calc.gross_profit|money }}
+                            </td>'''
+
+HISTORY_ROW_END = '''
+                            <td>
+                                <form method="POST" action="/delete/%d" style="display:inline;">
+                                    <button type="submit" class="btn btn-danger btn-small">Delete</button>
+                                </form>
+                            </td>
+                        </tr>
+'''
+
+HISTORY_ROW_FIELDS = ('name', 'units', 'cost_per_unit', 'selling_price', 'profit_margin', 'gross_profit')
+
+_compiled_templates = {}
+
+def compiled(source):
+    """Compile a template source on first use and reuse it for every render."""
+    env = current_app.jinja_env
+    template = _compiled_templates.get((env, source))
+    if template is None:
+        template = _compiled_templates[(env, source)] = env.from_string(source)
+    return template
+
+def page_template():
+    return compiled(HTML_TEMPLATE)
+
+def render_history(calculations):
+    """Assemble the history table rows from cached per-record fragments."""
+    cells_template = compiled(HISTORY_ROW_CELLS)
+    parts = []
+    for index, calc in enumerate(calculations):
+        content_key = hash(tuple(calc.get(field) for field in HISTORY_ROW_FIELDS))
+        cells = history_fragments.get_or_render((g.workspace, calc.get('id')), content_key, lambda: cells_template.render(calc=calc))
+        parts.append(HISTORY_ROW_START % index)
+        parts.append(cells)
+        parts.append(HISTORY_ROW_END % index)
+    return Markup(''.join(parts))
+
+@routes.before_app_request
+def start_request_profile():
+    profiler.start(request.headers)
+
+@routes.before_app_request
+def select_workspace():
+    """Pick the workspace from ?workspace=, the X-Workspace header or the cookie."""
+    try:
+        g.workspace = validate_workspace(
+            request.args.get('workspace') or request.headers.get('X-Workspace') or request.cookies.get('workspace')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@routes.after_app_request
+def remember_workspace(response):
+    if 'workspace' in request.args and 'workspace' in g:
+        response.set_cookie('workspace', g.workspace, samesite='Lax')
+    return response
+
+@routes.after_app_request
+def finish_request_profile(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    profiler.finish(route, request.method, request.path, response.status_code)
+    return response
+
+@routes.teardown_app_request
+def release_request_profile(exc):
+    profiler.abandon()
+
+@routes.route('/')
 def index():
-    calculations = load_calculations()
-    return render_template_string(HTML_TEMPLATE, calculations=calculations, result=None, result_json='', form_data={}, scenarios=None, comparison=None)
+    with phase('storage'):
+        calculations = load_calculations(g.workspace)
+    with phase('render'):
+        return render_template(page_template(), calculations=calculations, history_rows=render_history(calculations), result=None, result_json='', form_data={}, scenarios=None, comparison=None)
 
-@app.route('/calculate', methods=['POST'])
+@routes.route('/calculate', methods=['POST'])
 def calculate():
     # Store form data to keep values after calculation
     form_data = {
         "name": request.form.get('name', ''),
-        "units": int(request.form.get('units', 1) or 1),
-        "product_cost": float(request.form.get('product_cost', 0) or 0),
-        "transportation": float(request.form.get('transportation', 0) or 0),
-        "tax": float(request.form.get('tax', 0) or 0),
         "other_cost_name": request.form.get('other_cost_name', ''),
-        "other_costs": float(request.form.get('other_costs', 0) or 0),
-        "staff_salary": float(request.form.get('staff_salary', 0) or 0),
-        "marketing": float(request.form.get('marketing', 0) or 0),
-        "rent": float(request.form.get('rent', 0) or 0),
-        "utilities": float(request.form.get('utilities', 0) or 0),
-        "selling_price": float(request.form.get('selling_price', 0) or 0),
-        "target_margin": float(request.form.get('target_margin', 30) or 30),
+        **parse_form(request.form),
     }
 
     data = {
@@ -802,37 +930,38 @@ def calculate():
         **form_data
     }
 
-    calc = BusinessCalculator(data)
+    with phase('compute'):
+        # Auto-calculates the selling price if not provided; the form keeps
+        # the original value (0 if auto-calculated)
+        calc = run_calculation(data)
 
-    # Auto-calculate selling price if not provided
-    original_selling_price = form_data['selling_price']
-    if data['selling_price'] == 0:
-        data['selling_price'] = calc.price_for_margin(data['target_margin'])
-        calc = BusinessCalculator(data)
+        result = calc.to_dict()
+        result['id'] = data['id']
+        result['other_cost_name'] = form_data['other_cost_name']
 
-    # Keep original selling price in form (0 if auto-calculated)
-    form_data['selling_price'] = original_selling_price
+        scenarios = calc.scenario_analysis()
+        pricing = calc.pricing_ladder()
 
-    result = calc.to_dict()
-    result['id'] = data['id']
-    result['other_cost_name'] = form_data['other_cost_name']
+    chart_inputs = {key: value for key, value in form_data.items() if key != 'other_cost_name'}
+    chart_url = url_for('.chart', **chart_inputs)
 
-    scenarios = calc.scenario_analysis()
+    with phase('storage'):
+        calculations = load_calculations(g.workspace)
+    with phase('render'):
+        return render_template(page_template(), calculations=calculations, history_rows=render_history(calculations), result=result, result_json=json.dumps(result), form_data=form_data, scenarios=scenarios, comparison=None, chart_url=chart_url, pricing=pricing)
 
-    calculations = load_calculations()
-    return render_template_string(HTML_TEMPLATE, calculations=calculations, result=result, result_json=json.dumps(result), form_data=form_data, scenarios=scenarios, comparison=None)
-
-@app.route('/compare', methods=['POST'])
+@routes.route('/compare', methods=['POST'])
 def compare():
     indices = request.form.getlist('compare')
-    calculations = load_calculations()
+    with phase('storage'):
+        calculations = load_calculations(g.workspace)
 
     if len(indices) != 2:
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
 
     idx_a, idx_b = int(indices[0]), int(indices[1])
     if not (0 <= idx_a < len(calculations) and 0 <= idx_b < len(calculations)):
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
 
     calc_a = calculations[idx_a]
     calc_b = calculations[idx_b]
@@ -874,25 +1003,432 @@ def compare():
         'diffs': diffs,
     }
 
-    return render_template_string(HTML_TEMPLATE, calculations=calculations, result=None, result_json='', form_data={}, comparison=comparison, scenarios=None)
-
-@app.route('/save', methods=['POST'])
+    with phase('render'):
+        return render_template(page_template(), calculations=calculations, history_rows=render_history(calculations), result=None, result_json='', form_data={}, comparison=comparison, scenarios=None)
+
+@routes.route('/recalculate', methods=['POST'])
+def recalculate_preview():
+    """Recompute only the outputs affected by a field change, as JSON."""
+    payload = request.get_json(silent=True) or {}
+    try:
+        with phase('compute'):
+            state, changed = recalculate(payload.get('state') or {}, payload.get('delta') or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # JSON has no infinity or NaN; send null for "never" / "unreachable"
+    def finite(values):
+        return {k: (v if math.isfinite(v) else None) for k, v in values.items()}
+
+    return jsonify({'state': finite(state), 'changed': finite(changed)})
+
+@routes.route('/whatif', methods=['POST'])
+def whatif():
+    """Apply {"shocks": [...], "name": ...} to every saved calculation, without saving."""
+    from whatif import apply_shocks  # NumPy is only loaded once someone asks
+
+    payload = request.get_json(silent=True) or {}
+    with phase('storage'):
+        calculations = load_calculations(g.workspace)
+    try:
+        with phase('compute'):
+            result = apply_shocks(calculations, payload.get('shocks'), payload.get('name'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+def parse_breakpoints(text):
+    """Parse "0:5,1000:4.5" into [(0.0, 5.0), (1000.0, 4.5)]."""
+    points = []
+    for pair in filter(None, (text or '').split(',')):
+        units, _, value = pair.partition(':')
+        points.append((float(units), float(value)))
+    return points
+
+@routes.route('/chart')
+def chart():
+    """Break-even SVG for the inputs in the query string.
+
+    ?axis=volume (default) or price; tiers=0:5,1000:4.5 and steps=2000:3500
+    as for the piecewise cost model; width and height in pixels.
+    """
+    from chart import (break_even_chart, chart_key, AXES, DEFAULT_WIDTH, DEFAULT_HEIGHT,
+                       MIN_WIDTH, MAX_WIDTH, MIN_HEIGHT, MAX_HEIGHT)
+
+    axis = request.args.get('axis', 'volume')
+    if axis not in AXES:
+        return jsonify({'error': 'axis must be one of: %s' % ', '.join(AXES)}), 400
+    try:
+        data = parse_row(request.args)
+        tiers = parse_breakpoints(request.args.get('tiers'))
+        steps = parse_breakpoints(request.args.get('steps'))
+        width = min(max(int(request.args.get('width', DEFAULT_WIDTH)), MIN_WIDTH), MAX_WIDTH)
+        height = min(max(int(request.args.get('height', DEFAULT_HEIGHT)), MIN_HEIGHT), MAX_HEIGHT)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    key = chart_key(data, axis, tiers, steps, width, height)
+    if key in request.if_none_match:
+        return current_app.response_class(status=304)
+    try:
+        with phase('compute'):
+            svg = chart_cache.get_or_render(None, key, lambda: break_even_chart(data, axis, tiers, steps, width, height))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    response = current_app.response_class(svg, mimetype='image/svg+xml')
+    response.set_etag(key)
+    response.cache_control.max_age = 3600
+    return response
+
+@routes.route('/pricing', methods=['POST'])
+def pricing():
+    """Pricing ladder for {"margins": [...], "markups": [...]}.
+
+    With "inputs" (calculator input fields), returns the ladder for that one
+    calculation and, with "prices", the margin and markup each price gives.
+    Without, returns a rate card over every saved calculation.
+    """
+    from pricing import number_list, rate_card, validate_rungs  # NumPy is only loaded once someone asks
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        margins, markups = validate_rungs(payload.get('margins', DEFAULT_MARGINS),
+                                          payload.get('markups', DEFAULT_MARKUPS))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    if 'inputs' in payload:
+        try:
+            if not isinstance(payload['inputs'], dict):
+                raise ValueError("inputs must be an object")
+            calc = run_calculation(parse_row(payload['inputs']))
+            with phase('compute'):
+                ladder = calc.pricing_ladder(margins, markups)
+                implied = [calc.implied_rates(p) for p in number_list(payload.get('prices', [calc.selling_price]), "prices")]
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        for rung in ladder:
+            rung['breakeven_units'] = None if rung['breakeven_units'] == float('inf') else rung['breakeven_units']
+        return jsonify({'cost_per_unit': calc.cost_per_unit, 'ladder': ladder, 'implied': implied})
+
+    with phase('storage'):
+        calculations = load_calculations(g.workspace)
+    try:
+        with phase('compute'):
+            card = rate_card(calculations, margins, markups)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(card)
+
+@routes.route('/jobs', methods=['GET', 'POST'])
+def jobs():
+    """List background jobs, or submit one as {"kind": ..., "params": {...}}."""
+    if request.method == 'GET':
+        return jsonify({'jobs': [status for status in job_queue.list() if status['workspace'] == g.workspace]})
+
+    payload = request.get_json(silent=True) or {}
+    params = dict(payload.get('params') or {})
+    # Jobs are only visible from their own workspace, so they must run there
+    if params.setdefault('workspace', g.workspace) != g.workspace:
+        return jsonify({'error': 'params.workspace must be the current workspace (%s)' % g.workspace}), 400
+    try:
+        job = job_queue.submit(payload.get('kind'), params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify(job.to_dict()), 202
+
+def workspace_job_status(job_id):
+    """The job's status, or None if it is unknown or belongs to another workspace."""
+    status = job_queue.status(job_id)
+    if status is None or status['workspace'] != g.workspace:
+        return None
+    return status
+
+@routes.route('/jobs/<job_id>')
+def job_status(job_id):
+    status = workspace_job_status(job_id)
+    if status is None:
+        return jsonify({'error': 'unknown job'}), 404
+    return jsonify(status)
+
+@routes.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    status = workspace_job_status(job_id)
+    if status is None:
+        return jsonify({'error': 'unknown job'}), 404
+    if status['state'] not in FINISHED_STATES:
+        return jsonify(status), 202
+    result = job_queue.result(job_id)
+    if result is None:
+        return jsonify({'error': 'no result for this job'}), 404
+    return jsonify({'id': job_id, 'result': result})
+
+@routes.route('/jobs/<job_id>/cancel', methods=['POST'])
+def job_cancel(job_id):
+    if workspace_job_status(job_id) is None:
+        return jsonify({'error': 'unknown job'}), 404
+    status = job_queue.cancel(job_id)
+    if status is None:
+        return jsonify({'error': 'unknown job'}), 404
+    return jsonify(status)
+
+@routes.route('/workspaces')
+def workspaces():
+    return jsonify({'current': g.workspace, 'workspaces': list_workspaces()})
+
+@routes.route('/dedupe', methods=['GET', 'POST'])
+def dedupe():
+    """Report duplicate saves; POST also folds duplicates already on disk."""
+    removed = 0
+    if request.method == 'POST':
+        with phase('storage'):
+            removed = dedupe_calculations(g.workspace)
+        history_fragments.clear()
+    calculations = load_calculations(g.workspace)
+    return jsonify({'records': len(calculations), 'duplicates': duplicate_count(calculations), 'removed': removed})
+
+@routes.route('/search')
+def search():
+    """Saved calculations whose names match ?q=, by substring or ?mode=prefix."""
+    query = request.args.get('q', '')
+    mode = request.args.get('mode', 'substring')
+    if mode not in MODES:
+        return jsonify({'error': 'mode must be one of: %s' % ', '.join(MODES)}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+
+    with phase('storage'):
+        index = search_indexes.current(g.workspace)
+    with phase('compute'):
+        results, more = index.search(query, mode, limit)
+    return jsonify({'query': query, 'mode': mode, 'results': results, 'more': more})
+
+@routes.route('/admin/profiles')
+def admin_profiles():
+    """Recent request profiles per route; needs the profiler admin token."""
+    if not profiler.settings.is_admin(request.headers):
+        return jsonify({'error': 'not found'}), 404
+    return jsonify(profiler.recent_profiles())
+
+@routes.route('/save', methods=['POST'])
 def save():
     result_data = json.loads(request.form['result_data'])
-    calculations = load_calculations()
-    calculations.append(result_data)
-    save_calculations(calculations)
-    return redirect(url_for('index'))
+    with phase('storage'):
+        added, version = apply_change(lambda calculations: add_calculations(calculations, [result_data]),
+                                      g.workspace, with_version=True)
+    search_indexes.applied(g.workspace, version, added=added)
+    return redirect(url_for('.index'))
 
-@app.route('/delete/<int:index>', methods=['POST'])
+@routes.route('/delete/<int:index>', methods=['POST'])
 def delete(index):
-    calculations = load_calculations()
-    if 0 <= index < len(calculations):
-        calculations.pop(index)
-        save_calculations(calculations)
-    return redirect(url_for('index'))
+    with phase('storage'):
+        calculations = load_calculations(g.workspace)
+        if 0 <= index < len(calculations):
+            # Delete by id, since concurrent deletes may shift the indices
+            target = calculations[index]
+            if target.get('id'):
+                match = lambda calc: calc.get('id') == target['id']
+            else:
+                match = lambda calc: calc == target
+            removed, version = apply_change(lambda calcs: remove_where(calcs, match, limit=1),
+                                            g.workspace, with_version=True)
+            forget_fragments(removed)
+            search_indexes.applied(g.workspace, version, removed=removed)
+    return redirect(url_for('.index'))
+
+FILTER_OPS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'contains': lambda value, text: str(text).lower() in str(value).lower(),
+}
+
+def remove_where(calculations, match, limit=None):
+    """Remove matching calculations in place and return the removed ones."""
+    kept, removed = [], []
+    for calc in calculations:
+        if (limit is None or len(removed) < limit) and match(calc):
+            removed.append(calc)
+        else:
+            kept.append(calc)
+    calculations[:] = kept
+    return removed
+
+def add_with_ids(calculations, records):
+    """add_calculations(), refusing ids that already belong to a different record.
+
+    Raises ValueError before changing anything. Re-sending a saved record
+    with its id is a plain duplicate.
+    """
+    taken = {calc['id']: calc.get('content_hash') or content_hash(calc) for calc in calculations if calc.get('id')}
+    clashes = [r['id'] for r in records if taken.get(r['id'], r['content_hash']) != r['content_hash']]
+    if clashes:
+        raise ValueError('ids already used by other calculations: %s' % ', '.join(clashes[:10]))
+    return add_calculations(calculations, records)
+
+def forget_fragments(removed):
+    for calc in removed:
+        history_fragments.invalidate((g.workspace, calc.get('id')))
+
+def build_filter(conditions):
+    """Turn [{"field": ..., "op": ..., "value": ...}, ...] into a predicate (all must hold)."""
+    if isinstance(conditions, dict):
+        conditions = [conditions]
+    if not isinstance(conditions, list) or not conditions:
+        # An empty filter would match, and so delete, every record
+        raise ValueError("filter must be a condition or a non-empty list of conditions")
+    checks = []
+    for condition in conditions:
+        if not isinstance(condition, dict):
+            raise ValueError("each filter must be an object with field, op and value")
+        op = FILTER_OPS.get(condition.get('op'))
+        field = condition.get('field')
+        if op is None or not field:
+            raise ValueError("filters need a field and one of: %s" % ', '.join(FILTER_OPS))
+        checks.append((field, op, condition.get('value')))
+
+    def match(calc):
+        for field, op, value in checks:
+            current = calc.get(field)
+            try:
+                if current is None or not op(current, value):
+                    return False
+            except TypeError:
+                return False
+        return True
+    return match
+
+@routes.route('/bulk/save', methods=['POST'])
+def bulk_save():
+    """Save {"results": [...]} in a single write."""
+    results = (request.get_json(silent=True) or {}).get('results')
+    if not isinstance(results, list) or not all(isinstance(r, dict) for r in results):
+        return jsonify({'error': 'results must be a list of calculation objects'}), 400
+
+    # Recompute every record from its inputs, so stored metrics are never
+    # missing or inconsistent with what the client sent
+    base_id = generate_id()
+    records = []
+    try:
+        with phase('compute'):
+            for i, result in enumerate(results):
+                record = run_calculation(parse_row(result)).to_dict()
+                record['id'] = result.get('id') or '%s-%d' % (base_id, i)
+                record['other_cost_name'] = result.get('other_cost_name', '')
+                record['content_hash'] = content_hash(record)
+                records.append(record)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': 'invalid calculation inputs: %s' % e}), 400
+    results = records
+
+    # Client ids key the search index and the history fragments, so one id
+    # must never name two different records
+    seen = {}
+    for record in results:
+        if seen.setdefault(record['id'], record['content_hash']) != record['content_hash']:
+            return jsonify({'error': 'id %s is used by two different results' % record['id']}), 400
+
+    try:
+        with phase('storage'):
+            added, version = apply_change(lambda calculations: add_with_ids(calculations, results),
+                                          g.workspace, with_version=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    search_indexes.applied(g.workspace, version, added=added)
+    return jsonify({'saved': len(added), 'duplicates': len(results) - len(added), 'ids': [r['id'] for r in added]})
+
+@routes.route('/bulk/delete', methods=['POST'])
+def bulk_delete():
+    """Delete by {"ids": [...]} or by {"filter": {"field": "profit_margin", "op": "<", "value": 0}}."""
+    payload = request.get_json(silent=True) or {}
+    if 'ids' in payload:
+        if not isinstance(payload['ids'], list):
+            return jsonify({'error': 'ids must be a list'}), 400
+        ids = set(str(i) for i in payload['ids'])
+        match = lambda calc: str(calc.get('id')) in ids
+    elif 'filter' in payload:
+        try:
+            match = build_filter(payload['filter'])
+        except (ValueError, AttributeError) as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        return jsonify({'error': 'give either ids or filter'}), 400
+
+    with phase('storage'):
+        removed, version = apply_change(lambda calculations: remove_where(calculations, match),
+                                        g.workspace, with_version=True)
+    forget_fragments(removed)
+    search_indexes.applied(g.workspace, version, removed=removed)
+    return jsonify({'deleted': len(removed), 'ids': [calc.get('id') for calc in removed]})
+
+# Heavier modules the routes import on first use; preloaded by warm_up()
+PRELOAD_MODULES = ("vectorized", "cost_model", "pricing", "chart", "whatif", "sensitivity", "projection", "demand")
+
+# Filled in by warm_up(), reported by /ready
+warm_state = {'ready': False, 'seconds': None, 'workspaces': 0, 'records': 0}
+
+def warm_up(app):
+    """Do the work of every worker's first requests once, up front.
+
+    Imports the NumPy-backed modules, compiles the templates, parses each
+    workspace's history and renders its page (filling the fragment cache)
+    and builds its search index. Run before a pre-forking server forks,
+    the result is shared copy-on-write by all workers; gc.freeze() keeps
+    the garbage collector from touching (and so copying) those objects.
+    """
+    started = time.perf_counter()
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+    with app.app_context():
+        page_template()
+        compiled(HISTORY_ROW_CELLS)
+
+    client = app.test_client()
+    workspaces = list_workspaces()
+    records = 0
+    for workspace in workspaces:
+        records += len(load_calculations(workspace))
+        client.get('/', headers={'X-Workspace': workspace})
+        search_indexes.current(workspace)
+
+    gc.collect()
+    gc.freeze()
+    warm_state.update(ready=True, seconds=round(time.perf_counter() - started, 3),
+                      workspaces=len(workspaces), records=records)
+
+def create_app(config=None, warm=True):
+    """Build a new app with config applied and warm it up (see warm_up()).
+
+    Each call returns a fresh Flask app with its own config. Warm-up fills
+    process-wide caches, so it runs once per process.
+    """
+    app = Flask(__name__)
+    if config:
+        app.config.update(config)
+    app.register_blueprint(routes)
+    if warm and not warm_state['ready']:
+        warm_up(app)
+    return app
+
+@routes.route('/ready')
+def ready():
+    """Readiness check: 200 once warm-up has finished, 503 before."""
+    state = dict(warm_state, pid=os.getpid())
+    return jsonify(state), 200 if state['ready'] else 503
+
+# For `flask --app app`, tests and scripts; serve.py builds its own
+app = create_app(warm=False)
 
 if __name__ == '__main__':
+    app = create_app()
     print("\n" + "="*50)
     print("  Business Calculator")
     print("="*50)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Batch runner - the calculator over very large CSV files, in parallel.
+
+The input is split into byte-range chunks on line boundaries (found with
+mmap, so nothing is read into memory up front). Each chunk is processed
+by a worker process in blocks of rows using the vectorized calculator
+math, and written to its own output shard. Shards are merged in order
+once every chunk is done.
+
+Shards are written to a temporary name and renamed when complete, and
+the chunk plan is kept in a manifest, so an interrupted run picks up
+where it left off when started again with the same arguments:
+
+    python batch_runner.py products.csv results.csv --workers 8
+
+Rows must not contain quoted newlines. Values equal those of
+`python -m calculator batch`; numbers are always written as floats, so a
+value the CLI prints as 0 comes out as 0.0 here.
+"""
+
+import argparse
+import csv
+import glob
+import json
+import mmap
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from calculator import INPUT_FIELDS
+from cli import RESULT_FIELDS
+
+DEFAULT_CHUNK_BYTES = 32 * 1024 * 1024
+DEFAULT_BLOCK_ROWS = 50000
+
+OUTPUT_METRICS = RESULT_FIELDS[len(INPUT_FIELDS) + 1:]
+DEFAULT_TEXT = {field: "0" for field in INPUT_FIELDS}
+DEFAULT_TEXT["units"] = "1"
+
+
+def plan_chunks(input_path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Split a CSV file into (start, end) byte ranges that end on line breaks.
+
+    Returns (header, chunks), where header is the list of column names.
+    """
+    with open(input_path, "rb") as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line.decode("utf-8-sig")]), [])
+        size = os.fstat(f.fileno()).st_size
+        start = len(header_line)
+        if size <= start:
+            return header, []
+
+        chunks = []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            while start < size:
+                end = start + chunk_bytes
+                if end >= size:
+                    end = size
+                else:
+                    newline = mm.find(b"\n", end)
+                    end = size if newline == -1 else newline + 1
+                chunks.append((start, end))
+                start = end
+    return header, chunks
+
+
+def _column(rows, index, field):
+    if index is None:
+        return [DEFAULT_TEXT[field]] * len(rows)
+    default = DEFAULT_TEXT[field]
+    return [(row[index] if index < len(row) else "") or default for row in rows]
+
+
+def compute_block(rows, header_index):
+    """Run the calculator over parsed CSV rows; returns output rows."""
+    import numpy as np
+    from vectorized import auto_price, metrics
+
+    arrays = {}
+    for field in INPUT_FIELDS:
+        arrays[field] = np.array(_column(rows, header_index.get(field), field), dtype=float)
+    arrays["units"] = np.trunc(arrays["units"])
+
+    # target_margin >= 100 prices at inf, and inf - inf is NaN, as in calculator.py
+    with np.errstate(invalid="ignore"):
+        priced = auto_price(arrays)
+        results = metrics(priced)
+
+    name_index = header_index.get("name")
+    if name_index is None:
+        names = ["Untitled"] * len(rows)
+    else:
+        names = [(row[name_index] if name_index < len(row) else "") or "Untitled" for row in rows]
+
+    columns = [names, priced["units"].astype(int).tolist()]
+    columns.extend(priced[field].tolist() for field in INPUT_FIELDS[1:])
+    columns.extend(results[key].tolist() for key in OUTPUT_METRICS)
+    return zip(*columns)
+
+
+def process_chunk(input_path, start, end, header, shard_path, block_rows=DEFAULT_BLOCK_ROWS):
+    """Process one byte range of the input into a shard file. Returns the row count."""
+    header_index = {name: i for i, name in enumerate(header)}
+    count = 0
+    tmp_path = shard_path + ".tmp"
+    with open(input_path, "rb") as source, open(tmp_path, "w", newline="") as out:
+        source.seek(start)
+        writer = csv.writer(out)
+        remaining = end - start
+        while remaining > 0:
+            lines = []
+            while len(lines) < block_rows and remaining > 0:
+                line = source.readline()
+                if not line:
+                    remaining = 0
+                    break
+                remaining -= len(line)
+                lines.append(line.decode("utf-8"))
+            rows = [row for row in csv.reader(lines) if row]
+            writer.writerows(compute_block(rows, header_index))
+            count += len(rows)
+    os.replace(tmp_path, shard_path)
+    return count
+
+
+def _manifest_for(input_path, chunk_bytes, header, chunks):
+    stat = os.stat(input_path)
+    return {
+        "input": os.path.abspath(input_path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "chunk_bytes": chunk_bytes,
+        "header": header,
+        "chunks": chunks,
+    }
+
+
+def _shard_path(work_dir, index):
+    return os.path.join(work_dir, "part-%06d.csv" % index)
+
+
+def _clear_work_dir(work_dir):
+    """Delete the shards, temp files and manifest a run left in work_dir.
+
+    Nothing else is touched, so a --work-dir that holds other files is safe.
+    """
+    names = ["manifest.json"]
+    for pattern in ("part-*.csv", "part-*.csv.tmp"):
+        names.extend(os.path.basename(path) for path in glob.glob(os.path.join(work_dir, pattern)))
+    for name in names:
+        try:
+            os.remove(os.path.join(work_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+def run_batch(input_path, output_path, workers=None, chunk_bytes=DEFAULT_CHUNK_BYTES,
+              block_rows=DEFAULT_BLOCK_ROWS, work_dir=None, keep_shards=False):
+    """Run the calculator over input_path into output_path, resuming if possible.
+
+    Returns a stats dict: chunks, skipped (already done), rows processed in
+    this run and elapsed seconds.
+    """
+    started = time.time()
+    own_dir = not work_dir
+    work_dir = work_dir or output_path + ".parts"
+    manifest_path = os.path.join(work_dir, "manifest.json")
+
+    header, chunks = plan_chunks(input_path, chunk_bytes)
+    manifest = _manifest_for(input_path, chunk_bytes, header, [list(c) for c in chunks])
+
+    previous = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+    if previous != manifest:
+        # Different input or chunking: earlier shards can't be reused
+        _clear_work_dir(work_dir)
+        os.makedirs(work_dir, exist_ok=True)
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f)
+
+    pending = [i for i in range(len(chunks)) if not os.path.exists(_shard_path(work_dir, i))]
+    rows = 0
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(process_chunk, input_path, chunks[i][0], chunks[i][1], header,
+                            _shard_path(work_dir, i), block_rows)
+                for i in pending
+            ]
+            for future in as_completed(futures):
+                rows += future.result()
+
+    tmp_output = output_path + ".tmp"
+    with open(tmp_output, "w", newline="") as out:
+        csv.writer(out).writerow(RESULT_FIELDS)
+        out.flush()
+        for i in range(len(chunks)):
+            with open(_shard_path(work_dir, i)) as shard:
+                shutil.copyfileobj(shard, out, 1024 * 1024)
+    os.replace(tmp_output, output_path)
+
+    if not keep_shards:
+        _clear_work_dir(work_dir)
+        if own_dir:
+            try:
+                os.rmdir(work_dir)
+            except OSError:
+                pass  # something else was put there
+
+    return {
+        "chunks": len(chunks),
+        "skipped": len(chunks) - len(pending),
+        "rows": rows,
+        "seconds": round(time.time() - started, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the calculator over a large CSV file in parallel")
+    parser.add_argument("input", help="CSV with one input field per column")
+    parser.add_argument("output", help="CSV to write the results to")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-mb", type=float, default=DEFAULT_CHUNK_BYTES / (1024 * 1024),
+                        help="bytes of input per chunk, in MB")
+    parser.add_argument("--block-rows", type=int, default=DEFAULT_BLOCK_ROWS,
+                        help="rows held in memory at once per worker")
+    parser.add_argument("--work-dir", help="where to keep shards (default: OUTPUT.parts); "
+                        "only the runner's own files in it are deleted")
+    parser.add_argument("--keep-shards", action="store_true")
+    args = parser.parse_args(argv)
+
+    stats = run_batch(args.input, args.output, args.workers, int(args.chunk_mb * 1024 * 1024),
+                      args.block_rows, args.work_dir, args.keep_shards)
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark - cold import plus first request, checked against a budget.
+
+Each measurement runs in a fresh interpreter so nothing is already imported:
+
+  cli  import calculator + cli and run one calculation; Flask and NumPy
+       must not be imported at all
+  app  import app and serve GET / through the Flask test client
+
+Exits non-zero if any run is over budget, so CI can enforce it:
+
+    python bench_startup.py
+    python bench_startup.py --runs 5 --cli-budget 150 --app-budget 800
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CLI_BUDGET_MS = 250
+APP_BUDGET_MS = 1000
+
+CLI_SCRIPT = r'''
+import io, json, sys, time
+start = time.perf_counter()
+import cli
+cli.main(["calc", "--units", "100", "--product-cost", "5", "--rent", "1000"], out=io.StringIO())
+elapsed = (time.perf_counter() - start) * 1000
+heavy = sorted(m for m in ("flask", "numpy", "jinja2", "werkzeug") if m in sys.modules)
+print(json.dumps({"ms": elapsed, "heavy": heavy}))
+'''
+
+APP_SCRIPT = r'''
+import json, sys, time
+start = time.perf_counter()
+import app
+client = app.app.test_client()
+response = client.get("/")
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({"ms": elapsed, "status": response.status_code, "numpy": "numpy" in sys.modules}))
+'''
+
+
+def _run(script):
+    output = subprocess.run([sys.executable, "-c", script], cwd=HERE, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(script, runs):
+    results = [_run(script) for _ in range(runs)]
+    return statistics.median(r["ms"] for r in results), results[-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold start benchmark")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--cli-budget", type=float, default=CLI_BUDGET_MS, help="ms")
+    parser.add_argument("--app-budget", type=float, default=APP_BUDGET_MS, help="ms")
+    args = parser.parse_args(argv)
+
+    failures = []
+
+    cli_ms, cli_last = measure(CLI_SCRIPT, args.runs)
+    print("cli  import + first calculation: %7.1f ms (budget %.0f ms)" % (cli_ms, args.cli_budget))
+    if cli_ms > args.cli_budget:
+        failures.append("cli over budget")
+    if cli_last["heavy"]:
+        failures.append("cli imported %s" % ", ".join(cli_last["heavy"]))
+
+    app_ms, app_last = measure(APP_SCRIPT, args.runs)
+    print("app  import + first GET /:       %7.1f ms (budget %.0f ms)" % (app_ms, args.app_budget))
+    if app_ms > args.app_budget:
+        failures.append("app over budget")
+    if app_last["status"] != 200:
+        failures.append("GET / returned %s" % app_last["status"])
+    if app_last["numpy"]:
+        failures.append("app imported numpy at startup")
+
+    for failure in failures:
+        print("FAIL: " + failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,23 @@
 Business Calculator - Core calculation logic.
 """
 
+import hashlib
+import json
+import math
+
+# Input fields, grouped the same way the form groups them
+FIXED_COST_FIELDS = ("staff_salary", "rent", "utilities", "marketing")
+VARIABLE_COST_FIELDS = ("product_cost", "transportation", "tax", "other_costs")
+INPUT_FIELDS = ("units",) + VARIABLE_COST_FIELDS + FIXED_COST_FIELDS + ("selling_price", "target_margin")
+
+# What a blank field means in the web form
+FORM_DEFAULTS = {field: 0 for field in INPUT_FIELDS}
+FORM_DEFAULTS.update(units=1, target_margin=30)
+
+# Rungs of the default pricing ladder (percent)
+DEFAULT_MARGINS = (20, 30, 40, 50, 60)
+DEFAULT_MARKUPS = ()
+
 
 class BusinessCalculator:
     """Core business calculation engine."""
@@ -30,10 +47,15 @@ class BusinessCalculator:
         """Calculate total fixed costs (don't change with units)."""
         return self.staff_salary + self.rent + self.utilities + self.marketing
 
+    @property
+    def variable_cost_per_unit(self):
+        """Calculate variable cost for a single unit."""
+        return self.product_cost + self.transportation + self.tax + self.other_costs
+
     @property
     def total_variable_costs(self):
         """Calculate total variable costs (change with units)."""
-        return (self.product_cost + self.transportation + self.tax + self.other_costs) * self.units
+        return self.variable_cost_per_unit * self.units
 
     @property
     def total_costs(self):
@@ -86,12 +108,50 @@ class BusinessCalculator:
         """Calculate selling price needed for a target markup."""
         return self.cost_per_unit * (1 + target_markup / 100)
 
+    def implied_rates(self, price):
+        """Margin and markup (percent) a given selling price would give."""
+        profit_per_unit = price - self.cost_per_unit
+        return {
+            'price': price,
+            'margin': (profit_per_unit / price * 100) if price > 0 else 0,
+            'markup': (profit_per_unit / self.cost_per_unit * 100) if self.cost_per_unit > 0 else 0,
+        }
+
+    def pricing_ladder(self, margins=DEFAULT_MARGINS, markups=DEFAULT_MARKUPS):
+        """Prices for a list of target margins and markups.
+
+        Each rung has the price, profit per unit and in total at the
+        current volume, and the units needed to cover fixed costs at that
+        price. See pricing.py for the same ladder over many records.
+        """
+        variable_per_unit = self.variable_cost_per_unit
+        fixed = self.total_fixed_costs
+        rungs = [('margin', m, self.price_for_margin(m)) for m in margins]
+        rungs += [('markup', m, self.price_for_markup(m)) for m in markups]
+
+        ladder = []
+        for kind, target, price in rungs:
+            contribution = price - variable_per_unit
+            ladder.append({
+                'kind': kind,
+                'target': target,
+                'price': price,
+                'profit_per_unit': price - self.cost_per_unit,
+                'profit': (price - self.cost_per_unit) * self.units,
+                'breakeven_units': fixed / contribution if contribution > 0 else float('inf'),
+            })
+        return ladder
+
     def units_to_breakeven(self):
-        """Calculate units needed to break even at current price."""
-        profit_per_unit = self.selling_price - self.cost_per_unit
-        if profit_per_unit <= 0:
+        """Calculate units needed to break even at current price.
+
+        Each unit sold contributes its price less its variable cost towards
+        the fixed costs, as in pricing_ladder() and the break-even chart.
+        """
+        contribution = self.selling_price - self.variable_cost_per_unit
+        if contribution <= 0:
             return float('inf')
-        return self.total_fixed_costs / profit_per_unit
+        return self.total_fixed_costs / contribution
 
     def scenario_analysis(self, percentages=None):
         """Create scenarios at different volume percentages.
@@ -102,7 +162,7 @@ class BusinessCalculator:
         if percentages is None:
             percentages = [25, 50, 100, 150, 200, 300]
 
-        variable_per_unit = self.product_cost + self.transportation + self.tax + self.other_costs
+        variable_per_unit = self.variable_cost_per_unit
         fixed = self.total_fixed_costs
         scenarios = []
 
@@ -150,3 +210,73 @@ class BusinessCalculator:
             "gross_profit": self.gross_profit,
             "profit_margin": self.profit_margin,
         }
+
+
+def _number(field, value):
+    """One input value as a number (an int for units); rejects inf and NaN."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("%s must be a number" % field)
+    if not math.isfinite(number):
+        raise ValueError("%s must be a finite number" % field)
+    return int(number) if field == "units" else number
+
+
+def parse_row(row):
+    """Convert text values (a CSV row) into calculator input data."""
+    data = {"name": row.get("name") or "Untitled"}
+    for field in INPUT_FIELDS:
+        value = row.get(field)
+        if value not in (None, ""):
+            data[field] = _number(field, value)
+    return data
+
+
+def parse_form(values):
+    """Convert form values into calculator input data, as POST /calculate does.
+
+    Blank or missing fields take their FORM_DEFAULTS value; a 0 that was
+    typed in stays 0.
+    """
+    data = {}
+    for field in INPUT_FIELDS:
+        value = values.get(field)
+        if value is None or value == "":
+            value = FORM_DEFAULTS[field]
+        data[field] = _number(field, value)
+    return data
+
+
+def content_hash(data):
+    """Hash of the normalized calculator inputs, used to spot duplicate saves.
+
+    Two records hash the same when they have the same name, other-cost
+    label and input values, however the numbers were typed.
+    """
+    normalized = {
+        "name": str(data.get("name", "Untitled")).strip(),
+        "other_cost_name": str(data.get("other_cost_name") or "").strip(),
+    }
+    for field in INPUT_FIELDS:
+        value = float(data.get(field, 1 if field == "units" else 0) or 0)
+        normalized[field] = int(value) if field == "units" else round(value, 6)
+    encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+def calculate(data):
+    """Build a calculator the way the form does.
+
+    A selling price of 0 means "price for the target margin".
+    """
+    calc = BusinessCalculator(data)
+    if calc.selling_price == 0:
+        calc.selling_price = calc.price_for_margin(calc.target_margin)
+    return calc
+
+
+if __name__ == "__main__":
+    import sys
+    from cli import main
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Break-even chart - cost, revenue and profit curves as server-side SVG.
+
+The curves are evaluated at high resolution with the vectorized
+PiecewiseCostModel (so volume tiers and capacity steps show up), then
+each one is downsampled to the pixel budget with Largest-Triangle-
+Three-Buckets, which keeps the points that carry the shape (corners,
+steps) instead of every n-th one. The break-even point is solved exactly
+and drawn as a marker, so it never depends on which samples survived.
+
+Over volume the price is fixed at the calculation's selling price; over
+price the volume is fixed at its units.
+"""
+
+import hashlib
+import json
+from html import escape
+
+import numpy as np
+
+from calculator import calculate, content_hash
+from cost_model import PiecewiseCostModel
+
+AXES = ("volume", "price")
+RESOLUTION = 4096
+DEFAULT_WIDTH = 600
+DEFAULT_HEIGHT = 320
+MIN_WIDTH, MAX_WIDTH = 200, 2000
+MIN_HEIGHT, MAX_HEIGHT = 120, 1200
+MARGIN = {'left': 70, 'right': 20, 'top': 30, 'bottom': 40}
+TICKS = 5
+
+SERIES = (
+    ("total_costs", "Total costs", "#ff4466"),
+    ("revenue", "Revenue", "#00d4ff"),
+    ("profit", "Profit", "#00ff88"),
+)
+BREAKEVEN_COLOR = "#f7b32b"
+TEXT_COLOR = "#888"
+GRID_COLOR = "#333"
+
+
+def lttb(x, y, threshold):
+    """Downsample (x, y) to threshold points with Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last points; from each bucket in between keeps the
+    point forming the largest triangle with the previously kept point and
+    the average of the next bucket.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    every = (n - 2) / (threshold - 2)
+    edges = [int(i * every) + 1 for i in range(threshold - 1)]
+    # Bucket averages don't depend on which points get picked, so they are
+    # computed up front; the last "next bucket" is the final point
+    sizes = np.diff(edges + [n - 1])
+    avg_x = (np.add.reduceat(x[:-1], edges[:-1]) / sizes[:-1]).tolist() + [x[-1]]
+    avg_y = (np.add.reduceat(y[:-1], edges[:-1]) / sizes[:-1]).tolist() + [y[-1]]
+
+    xs, ys = x.tolist(), y.tolist()
+    keep = [0]
+    a = 0
+    for i in range(threshold - 2):
+        ax, ay = xs[a], ys[a]
+        cx, cy = avg_x[i + 1], avg_y[i + 1]
+        best, best_area = edges[i], -1.0
+        for j in range(edges[i], edges[i + 1]):
+            area = abs((ax - cx) * (ys[j] - ay) - (ax - xs[j]) * (cy - ay))
+            if area > best_area:
+                best, best_area = j, area
+        a = best
+        keep.append(a)
+    keep.append(n - 1)
+    return x[keep], y[keep]
+
+
+def curves(model, axis="volume", resolution=RESOLUTION):
+    """Cost, revenue and profit over volume or price, plus the break-even point.
+
+    Returns {x_label, x, series: {name: y}, breakeven: (x, y) or None}.
+    """
+    calc = model.calc
+    if axis == "volume":
+        breakeven = model.units_to_breakeven()
+        span = max(2 * calc.units, 10)
+        if np.isfinite(breakeven):
+            span = max(span, 1.5 * breakeven)
+        # Sample the tier and step breakpoints exactly, and just past each
+        # step, so corners and jumps are not smoothed over
+        breakpoints = np.concatenate((model.tier_starts, model.step_limits, model.step_limits * (1 + 1e-9)))
+        x = np.union1d(np.linspace(0, span, resolution), breakpoints[breakpoints <= span])
+        values = model.evaluate(x)
+        series = {key: values[key] for key, _, _ in SERIES}
+        point = None
+        if np.isfinite(breakeven):
+            point = (breakeven, float(model.total_costs(breakeven)))
+        return {'x_label': "Units", 'x': x, 'series': series, 'breakeven': point}
+
+    units = max(calc.units, 1)
+    total_costs = float(model.total_costs(units))
+    breakeven = total_costs / units
+    span = 2 * max(calc.selling_price, breakeven, 1e-9)
+    x = np.linspace(0, span, resolution)
+    revenue = x * units
+    series = {
+        'total_costs': np.full_like(x, total_costs),
+        'revenue': revenue,
+        'profit': revenue - total_costs,
+    }
+    return {'x_label': "Price per unit", 'x': x, 'series': series, 'breakeven': (breakeven, total_costs)}
+
+
+def _label(value):
+    magnitude = abs(value)
+    if magnitude >= 1e6:
+        return "%.1fM" % (value / 1e6)
+    if magnitude >= 1e4:
+        return "%.0fk" % (value / 1e3)
+    if magnitude >= 100 or value == int(value):
+        return "{:,.0f}".format(value)
+    return "{:,.2f}".format(value)
+
+
+def render_svg(chart, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, title=""):
+    """Draw a curves() result as an SVG document, one point per pixel at most."""
+    budget = max(int(width - MARGIN['left'] - MARGIN['right']), 3)
+    lines = {key: lttb(chart['x'], y, budget) for key, y in chart['series'].items()}
+
+    x_low, x_high = float(chart['x'][0]), float(chart['x'][-1])
+    y_low = min(0.0, *(float(y.min()) for y in chart['series'].values()))
+    y_high = max(0.0, *(float(y.max()) for y in chart['series'].values()))
+    if x_high <= x_low:
+        x_high = x_low + 1
+    if y_high <= y_low:
+        y_high = y_low + 1
+
+    plot_w = width - MARGIN['left'] - MARGIN['right']
+    plot_h = height - MARGIN['top'] - MARGIN['bottom']
+
+    def sx(value):
+        return MARGIN['left'] + (value - x_low) / (x_high - x_low) * plot_w
+
+    def sy(value):
+        return MARGIN['top'] + (y_high - value) / (y_high - y_low) * plot_h
+
+    parts = [
+        '<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" viewBox="0 0 %d %d" '
+        'font-family="sans-serif" font-size="11">' % (width, height, width, height),
+        '<title>%s</title>' % escape(title or "Break-even chart"),
+    ]
+
+    for value in np.linspace(y_low, y_high, TICKS):
+        y = sy(value)
+        parts.append('<line x1="%.1f" y1="%.1f" x2="%.1f" y2="%.1f" stroke="%s"/>'
+                     % (MARGIN['left'], y, width - MARGIN['right'], y, GRID_COLOR))
+        parts.append('<text x="%.1f" y="%.1f" fill="%s" text-anchor="end">%s</text>'
+                     % (MARGIN['left'] - 6, y + 4, TEXT_COLOR, escape(_label(value))))
+    for value in np.linspace(x_low, x_high, TICKS):
+        parts.append('<text x="%.1f" y="%.1f" fill="%s" text-anchor="middle">%s</text>'
+                     % (sx(value), height - MARGIN['bottom'] + 16, TEXT_COLOR, escape(_label(value))))
+    parts.append('<text x="%.1f" y="%.1f" fill="%s" text-anchor="middle">%s</text>'
+                 % (MARGIN['left'] + plot_w / 2, height - 6, TEXT_COLOR, escape(chart['x_label'])))
+
+    if y_low < 0 < y_high:
+        parts.append('<line x1="%.1f" y1="%.1f" x2="%.1f" y2="%.1f" stroke="%s" stroke-dasharray="4 3"/>'
+                     % (MARGIN['left'], sy(0), width - MARGIN['right'], sy(0), TEXT_COLOR))
+
+    legend_x = MARGIN['left']
+    for key, name, color in SERIES:
+        xs, ys = lines[key]
+        points = " ".join("%.1f,%.1f" % (sx(a), sy(b)) for a, b in zip(xs.tolist(), ys.tolist()))
+        parts.append('<polyline fill="none" stroke="%s" stroke-width="2" points="%s"/>' % (color, points))
+        parts.append('<rect x="%d" y="10" width="10" height="10" fill="%s"/>' % (legend_x, color))
+        parts.append('<text x="%d" y="19" fill="%s">%s</text>' % (legend_x + 14, TEXT_COLOR, name))
+        legend_x += 100
+
+    if chart['breakeven'] is not None:
+        bx, by = chart['breakeven']
+        if x_low <= bx <= x_high:
+            parts.append('<circle cx="%.1f" cy="%.1f" r="5" fill="%s"/>' % (sx(bx), sy(by), BREAKEVEN_COLOR))
+            parts.append('<text x="%.1f" y="%.1f" fill="%s" text-anchor="middle">Break-even: %s</text>'
+                         % (sx(bx), sy(by) - 10, BREAKEVEN_COLOR, escape(_label(bx))))
+
+    parts.append('</svg>')
+    return "\n".join(parts)
+
+
+def chart_key(data, axis, tiers=None, steps=None, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT):
+    """Hash of everything a chart depends on, for caching the SVG."""
+    options = [content_hash(data), axis, tiers or [], steps or [], width, height]
+    return hashlib.sha1(json.dumps(options).encode()).hexdigest()
+
+
+def break_even_chart(data, axis="volume", tiers=None, steps=None, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT):
+    """SVG chart for calculator input data (selling price 0 = price for target margin)."""
+    model = PiecewiseCostModel(calculate(data), tiers, steps)
+    return render_svg(curves(model, axis), width, height, model.calc.name)
@@ -0,0 +1,132 @@
+"""
+Command-line interface - calculator math without the web stack.
+
+    python -m calculator calc --name "Product A" --units 100 --product-cost 5 --rent 1000
+    python -m calculator scenarios --units 100 --product-cost 5 --selling-price 12
+    python -m calculator batch products.csv > results.csv
+    cat products.csv | python -m calculator batch --json
+
+Only the standard library and calculator.py are imported, so this starts
+fast enough for cron jobs and serverless wrappers.
+"""
+
+import argparse
+import csv
+import json
+import sys
+
+from calculator import INPUT_FIELDS, calculate, parse_row
+
+RESULT_FIELDS = ("name",) + INPUT_FIELDS + (
+    "total_costs", "cost_per_unit", "breakeven_price",
+    "total_revenue", "gross_profit", "profit_margin",
+)
+
+
+def _add_input_arguments(parser):
+    parser.add_argument("--name", default="Untitled")
+    for field in INPUT_FIELDS:
+        kind = int if field == "units" else float
+        default = 30 if field == "target_margin" else None
+        parser.add_argument("--" + field.replace("_", "-"), dest=field, type=kind, default=default)
+
+
+def _inputs(args):
+    data = {"name": args.name}
+    for field in INPUT_FIELDS:
+        value = getattr(args, field)
+        if value is not None:
+            data[field] = value
+    return data
+
+
+def _print_table(rows, columns, out):
+    widths = [max(len(c), *(len(r[i]) for r in rows)) if rows else len(c) for i, c in enumerate(columns)]
+    out.write("  ".join(c.rjust(w) for c, w in zip(columns, widths)) + "\n")
+    for row in rows:
+        out.write("  ".join(v.rjust(w) for v, w in zip(row, widths)) + "\n")
+
+
+def cmd_calc(args, out):
+    result = calculate(_inputs(args)).to_dict()
+    if args.json:
+        json.dump(result, out, indent=2)
+        out.write("\n")
+        return 0
+    for key in RESULT_FIELDS:
+        value = result[key]
+        text = str(value) if key in ("name", "units") else "{:,.2f}".format(value)
+        out.write("%-18s %s\n" % (key, text))
+    return 0
+
+
+def cmd_scenarios(args, out):
+    percentages = [float(p) for p in args.percentages.split(",")] if args.percentages else None
+    scenarios = calculate(_inputs(args)).scenario_analysis(percentages)
+    if args.json:
+        json.dump(scenarios, out, indent=2)
+        out.write("\n")
+        return 0
+    rows = []
+    for s in scenarios:
+        rows.append([
+            "%g%%%s" % (s['pct'], " *" if s['is_base'] else ""),
+            "{:,}".format(s['units']),
+            "{:,.2f}".format(s['total_costs']),
+            "{:,.2f}".format(s['cost_per_unit']),
+            "{:,.2f}".format(s['revenue']),
+            "{:,.2f}".format(s['profit']),
+            "%.1f%%" % s['margin'],
+        ])
+    _print_table(rows, ["volume", "units", "total_costs", "cost/unit", "revenue", "profit", "margin"], out)
+    return 0
+
+
+def cmd_batch(args, out):
+    source = sys.stdin if args.file == "-" else open(args.file, newline="")
+    try:
+        results = (calculate(parse_row(row)).to_dict() for row in csv.DictReader(source))
+        if args.json:
+            json.dump(list(results), out, indent=2)
+            out.write("\n")
+        else:
+            writer = csv.DictWriter(out, fieldnames=RESULT_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(results)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m calculator", description="Business calculator")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    calc = commands.add_parser("calc", help="calculate one product (selling price 0 = price for target margin)")
+    _add_input_arguments(calc)
+    calc.add_argument("--json", action="store_true", help="print JSON instead of text")
+    calc.set_defaults(handler=cmd_calc)
+
+    scenarios = commands.add_parser("scenarios", help="volume scenarios for one product")
+    _add_input_arguments(scenarios)
+    scenarios.add_argument("--percentages", help="comma-separated volume percentages, e.g. 50,100,200")
+    scenarios.add_argument("--json", action="store_true", help="print JSON instead of text")
+    scenarios.set_defaults(handler=cmd_scenarios)
+
+    batch = commands.add_parser("batch", help="calculate every row of a CSV file (one input field per column)")
+    batch.add_argument("file", nargs="?", default="-", help="CSV file, or - for stdin (default)")
+    batch.add_argument("--json", action="store_true", help="print JSON instead of CSV")
+    batch.set_defaults(handler=cmd_batch)
+
+    return parser
+
+
+def main(argv=None, out=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args, out or sys.stdout)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
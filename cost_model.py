@@ -0,0 +1,159 @@
+"""
+Piecewise cost model - volume-tiered product cost and stepped fixed costs.
+
+BusinessCalculator assumes a flat product_cost per unit and a flat fixed
+total. Here product_cost follows graduated volume tiers (units past a
+tier's threshold are bought at that tier's price) and fixed costs step up
+once units pass a capacity limit. Breakpoints and their cumulative totals
+are precomputed, so evaluating any number of volumes is a binary search
+(np.searchsorted) plus a multiply-add.
+"""
+
+import numpy as np
+
+from calculator import BusinessCalculator
+
+
+def _validate_breakpoints(points, what):
+    if any(b <= a for a, b in zip(points, points[1:])):
+        raise ValueError("%s must be in strictly increasing order" % what)
+    if points and points[0] < 0:
+        raise ValueError("%s cannot be negative" % what)
+
+
+class PiecewiseCostModel:
+    """Cost and profit curves for a calculation with tiers and steps.
+
+    tiers: list of (from_units, product_cost) pairs, e.g.
+        [(0, 5.00), (1000, 4.50), (5000, 4.00)]. Defaults to the flat
+        product_cost of the calculation.
+    steps: list of (capacity_units, extra_fixed_cost) pairs; each extra
+        cost is added once units exceed that capacity, e.g.
+        [(2000, 3500)] for a second shift beyond 2,000 units.
+    """
+
+    def __init__(self, data, tiers=None, steps=None):
+        calc = data if isinstance(data, BusinessCalculator) else BusinessCalculator(data)
+        self.calc = calc
+
+        if not tiers:
+            tiers = [(0, calc.product_cost)]
+        tiers = sorted((float(u), float(c)) for u, c in tiers)
+        if tiers[0][0] != 0:
+            raise ValueError("the first cost tier must start at 0 units")
+        _validate_breakpoints([u for u, _ in tiers], "tier thresholds")
+
+        steps = sorted((float(u), float(c)) for u, c in (steps or []))
+        _validate_breakpoints([u for u, _ in steps], "capacity limits")
+
+        # Variable cost: product tiers plus the flat per-unit costs
+        flat_per_unit = calc.variable_cost_per_unit - calc.product_cost
+        self.tier_starts = np.array([u for u, _ in tiers])
+        self.tier_rates = np.array([c for _, c in tiers]) + flat_per_unit
+        widths = np.diff(self.tier_starts)
+        self.tier_cumulative = np.concatenate(([0.0], np.cumsum(self.tier_rates[:-1] * widths)))
+
+        # Fixed cost: base plus every step whose capacity has been exceeded
+        self.base_fixed = calc.total_fixed_costs
+        self.step_limits = np.array([u for u, _ in steps])
+        self.step_cumulative = np.concatenate(([0.0], np.cumsum([c for _, c in steps])))
+
+    def variable_costs(self, units):
+        """Total variable costs at each volume."""
+        units = np.asarray(units, dtype=float)
+        k = np.searchsorted(self.tier_starts, units, side="right") - 1
+        k = np.clip(k, 0, None)
+        return self.tier_cumulative[k] + self.tier_rates[k] * (units - self.tier_starts[k])
+
+    def fixed_costs(self, units):
+        """Total fixed costs at each volume."""
+        units = np.asarray(units, dtype=float)
+        exceeded = np.searchsorted(self.step_limits, units, side="left")
+        return self.base_fixed + self.step_cumulative[exceeded]
+
+    def total_costs(self, units):
+        """Total costs at each volume."""
+        return self.fixed_costs(units) + self.variable_costs(units)
+
+    def profit(self, units, price=None):
+        """Gross profit at each volume (and optionally each price)."""
+        if price is None:
+            price = self.calc.selling_price
+        units = np.asarray(units, dtype=float)
+        return np.asarray(price, dtype=float) * units - self.total_costs(units)
+
+    def evaluate(self, units, price=None):
+        """Cost, revenue and profit curves over an array of volumes."""
+        if price is None:
+            price = self.calc.selling_price
+        units = np.asarray(units, dtype=float)
+        total_costs = self.total_costs(units)
+        revenue = np.asarray(price, dtype=float) * units
+        profit = revenue - total_costs
+        return {
+            "units": units,
+            "fixed_costs": self.fixed_costs(units),
+            "variable_costs": self.variable_costs(units),
+            "total_costs": total_costs,
+            "cost_per_unit": np.divide(total_costs, units, out=np.zeros_like(total_costs), where=units > 0),
+            "revenue": revenue,
+            "profit": profit,
+            "margin": np.divide(profit * 100, revenue, out=np.zeros_like(profit), where=revenue > 0),
+        }
+
+    def units_to_breakeven(self, price=None):
+        """Smallest volume at which profit reaches zero, solved exactly.
+
+        Profit is linear between breakpoints, so each segment is solved in
+        closed form and the first non-negative root wins. Returns inf if
+        profit never reaches zero.
+        """
+        if price is None:
+            price = self.calc.selling_price
+
+        starts = np.union1d(self.tier_starts, self.step_limits)
+        starts = starts[starts >= 0]
+        ends = np.append(starts[1:], np.inf)
+
+        # Linear profit a*q + b on (start, end], using the tier and step
+        # levels in force just after each segment start
+        k = np.searchsorted(self.tier_starts, starts, side="right") - 1
+        rate = self.tier_rates[k]
+        fixed = self.base_fixed + self.step_cumulative[np.searchsorted(self.step_limits, starts, side="right")]
+        slope = price - rate
+        intercept = -(self.tier_cumulative[k] - rate * self.tier_starts[k]) - fixed
+
+        if self.profit(0.0, price) >= 0:
+            return 0.0
+
+        at_start = slope * starts + intercept
+        with np.errstate(divide="ignore", invalid="ignore"):
+            root = np.where(slope > 0, -intercept / slope, np.inf)
+        root = np.where(at_start >= 0, starts, root)
+        valid = (root >= starts) & (root <= ends)
+        if not valid.any():
+            return float('inf')
+        return float(root[valid.argmax()])
+
+    def scenario_analysis(self, percentages=None):
+        """Same output as BusinessCalculator.scenario_analysis, with tiers and steps."""
+        if percentages is None:
+            percentages = [25, 50, 100, 150, 200, 300]
+
+        pcts = np.asarray(percentages, dtype=float)
+        units = np.maximum(1, np.round(self.calc.units * pcts / 100))
+        curves = self.evaluate(units)
+
+        scenarios = []
+        for i, pct in enumerate(percentages):
+            scenarios.append({
+                'pct': pct,
+                'units': int(units[i]),
+                'total_costs': float(curves["total_costs"][i]),
+                'cost_per_unit': float(curves["cost_per_unit"][i]),
+                'revenue': float(curves["revenue"][i]),
+                'profit': float(curves["profit"][i]),
+                'margin': float(curves["margin"][i]),
+                'is_base': pct == 100,
+            })
+        return scenarios
@@ -0,0 +1,204 @@
+"""
+Demand models and profit-maximizing price search.
+
+price_for_margin assumes units stay put as the price changes. A demand
+model maps price to units instead, and the optimizer picks the
+selling_price that maximizes (price - variable cost per unit) * units -
+fixed costs, using the calculator's fixed/variable split. Closed-form
+optima are used where the model has one; everything else goes through a
+vectorized coarse grid that is refined around the best point.
+
+Model parameters may be scalars or one value per record, so a whole
+history is optimized in one batched run.
+"""
+
+import numpy as np
+
+from vectorized import to_arrays, fixed_costs, variable_cost_per_unit
+
+GRID_POINTS = 64
+REFINE_ROUNDS = 4
+
+
+def _aligned(param, price):
+    """Reshape a per-record parameter so it broadcasts against price."""
+    param = np.asarray(param, dtype=float)
+    if param.ndim == 0:
+        return param
+    return param.reshape(param.shape + (1,) * (np.ndim(price) - param.ndim))
+
+
+class LinearDemand:
+    """units = intercept - slope * price, never below zero."""
+
+    def __init__(self, intercept, slope):
+        self.intercept = np.asarray(intercept, dtype=float)
+        self.slope = np.asarray(slope, dtype=float)
+
+    @classmethod
+    def through(cls, price, units, elasticity):
+        """Line through (price, units) with the given point elasticity."""
+        price = np.asarray(price, dtype=float)
+        units = np.asarray(units, dtype=float)
+        slope = np.abs(elasticity) * units / np.where(price > 0, price, 1.0)
+        return cls(units + slope * price, slope)
+
+    def units(self, price):
+        price = np.asarray(price, dtype=float)
+        return np.maximum(_aligned(self.intercept, price) - _aligned(self.slope, price) * price, 0)
+
+    def max_price(self):
+        """Price at which demand reaches zero."""
+        with np.errstate(divide="ignore"):
+            return np.where(self.slope > 0, self.intercept / self.slope, np.inf)
+
+    def optimal_price(self, variable_cost):
+        """Closed form: midpoint of unit cost and the choke price."""
+        choke = self.max_price()
+        price = (choke + variable_cost) / 2
+        return np.where(np.isfinite(choke), np.clip(price, variable_cost, choke), np.nan)
+
+
+class ConstantElasticityDemand:
+    """units = scale * price ** -elasticity."""
+
+    def __init__(self, scale, elasticity):
+        self.scale = np.asarray(scale, dtype=float)
+        self.elasticity = np.abs(np.asarray(elasticity, dtype=float))
+
+    @classmethod
+    def through(cls, price, units, elasticity):
+        """Curve through (price, units) with the given elasticity."""
+        price = np.asarray(price, dtype=float)
+        return cls(np.asarray(units, dtype=float) * price ** np.abs(elasticity), elasticity)
+
+    def units(self, price):
+        price = np.asarray(price, dtype=float)
+        with np.errstate(divide="ignore"):
+            return _aligned(self.scale, price) * np.where(price > 0, price, np.nan) ** -_aligned(self.elasticity, price)
+
+    def max_price(self):
+        return np.full(np.shape(self.scale), np.inf)
+
+    def optimal_price(self, variable_cost):
+        """Closed form markup rule, only defined for elastic demand."""
+        e = self.elasticity
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(e > 1, variable_cost * e / (e - 1), np.nan)
+
+
+class InterpolatedDemand:
+    """Demand read off user-supplied (price, units) points, linearly interpolated.
+
+    Outside the supplied range demand is held at the end points.
+    """
+
+    def __init__(self, prices, volumes):
+        order = np.argsort(prices)
+        self.prices = np.asarray(prices, dtype=float)[order]
+        self.volumes = np.asarray(volumes, dtype=float)[order]
+        if len(self.prices) < 2:
+            raise ValueError("at least two price/volume points are needed")
+
+    def units(self, price):
+        return np.interp(price, self.prices, self.volumes)
+
+    def max_price(self):
+        return self.prices[-1]
+
+    def optimal_price(self, variable_cost):
+        return np.full(np.shape(variable_cost), np.nan)
+
+
+def _profit(demand, price, variable_cost, fixed):
+    units = demand.units(price)
+    return (price - _aligned(variable_cost, price)) * units - _aligned(fixed, price)
+
+
+def _grid_search(demand, variable_cost, fixed, low, high):
+    """Coarse grid over [low, high] per record, then zoom in around the best point."""
+    steps = np.linspace(0, 1, GRID_POINTS)
+    for _ in range(REFINE_ROUNDS):
+        prices = low[:, None] + (high - low)[:, None] * steps
+        profit = np.nan_to_num(_profit(demand, prices, variable_cost, fixed), nan=-np.inf)
+        best = profit.argmax(axis=1)
+        rows = np.arange(len(low))
+        width = (high - low) / (GRID_POINTS - 1)
+        center = prices[rows, best]
+        low = np.maximum(center - width, low)
+        high = np.minimum(center + width, high)
+    return center
+
+
+def optimize_price(demand, variable_cost, fixed, max_price=None):
+    """Find the profit-maximizing price for each record.
+
+    variable_cost and fixed are per-record arrays. max_price caps the
+    search where demand has no natural ceiling (defaults to 10x unit cost).
+    Returns a dict of arrays: price, units, revenue, profit, method.
+    """
+    variable_cost = np.atleast_1d(np.asarray(variable_cost, dtype=float))
+    fixed = np.broadcast_to(np.asarray(fixed, dtype=float), variable_cost.shape)
+
+    closed = np.broadcast_to(demand.optimal_price(variable_cost), variable_cost.shape)
+    use_grid = ~np.isfinite(closed)
+    price = np.array(closed)
+
+    if use_grid.any():
+        ceiling = np.broadcast_to(demand.max_price(), variable_cost.shape).astype(float)
+        if max_price is None:
+            fallback = np.maximum(variable_cost * 10, 1.0)
+        else:
+            fallback = np.broadcast_to(np.asarray(max_price, dtype=float), variable_cost.shape)
+        ceiling = np.where(np.isfinite(ceiling), ceiling, fallback)
+        low = np.maximum(variable_cost, 0.0)
+        high = np.maximum(ceiling, low)
+        price = np.where(use_grid, _grid_search(demand, variable_cost, fixed, low, high), price)
+
+    units = demand.units(price)
+    revenue = price * units
+    return {
+        "price": price,
+        "units": units,
+        "revenue": revenue,
+        "profit": revenue - variable_cost * units - fixed,
+        "method": np.where(use_grid, "grid", "closed_form"),
+    }
+
+
+def demand_for_records(arrays, model="linear", elasticity=1.5, points=None):
+    """Build one demand model per record, calibrated through its current price and units."""
+    if model == "linear":
+        return LinearDemand.through(arrays["selling_price"], arrays["units"], elasticity)
+    if model == "elasticity":
+        return ConstantElasticityDemand.through(arrays["selling_price"], arrays["units"], elasticity)
+    if model == "points":
+        if not points:
+            raise ValueError("the points model needs price/volume points")
+        prices, volumes = zip(*points)
+        return InterpolatedDemand(prices, volumes)
+    raise ValueError("unknown demand model: %s" % model)
+
+
+def optimize_calculations(records, model="linear", elasticity=1.5, points=None, max_price=None):
+    """Optimize the selling price of every saved calculation in one batched run."""
+    arrays = to_arrays(records)
+    demand = demand_for_records(arrays, model, elasticity, points)
+    variable = variable_cost_per_unit(arrays)
+    fixed = fixed_costs(arrays)
+    best = optimize_price(demand, variable, fixed, max_price)
+
+    current_profit = (arrays["selling_price"] - variable) * arrays["units"] - fixed
+
+    results = []
+    for i, record in enumerate(records):
+        results.append({
+            'name': record.get('name', 'Untitled'),
+            'current_price': float(arrays["selling_price"][i]),
+            'current_profit': float(current_profit[i]),
+            'optimal_price': float(best["price"][i]),
+            'optimal_units': float(best["units"][i]),
+            'optimal_profit': float(best["profit"][i]),
+            'method': str(best["method"][i]),
+        })
+    return results
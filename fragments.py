@@ -0,0 +1,66 @@
+"""
+Fragment cache - rendered HTML for saved records, rendered once.
+
+Saved calculations never change after /save, so the HTML for a record's
+history row can be rendered once and reused on every page. Entries are
+keyed on the record id plus a hash of the displayed values, dropped
+explicitly when a record is deleted, and bounded by an LRU.
+"""
+
+import threading
+from collections import OrderedDict
+
+MAX_FRAGMENTS = 10000
+
+
+class FragmentCache:
+    """LRU cache of rendered fragments, one current version per record id."""
+
+    def __init__(self, max_entries=MAX_FRAGMENTS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._by_id = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, record_id, content_key, render):
+        """Return the cached fragment, or render, store and return it."""
+        key = (record_id, content_key)
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return fragment
+
+        fragment = render()
+
+        with self._lock:
+            self.misses += 1
+            stale = self._by_id.get(record_id)
+            if record_id is not None and stale is not None and stale != key:
+                self._entries.pop(stale, None)
+            self._entries[key] = fragment
+            if record_id is not None:
+                self._by_id[record_id] = key
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                if self._by_id.get(old_key[0]) == old_key:
+                    del self._by_id[old_key[0]]
+        return fragment
+
+    def invalidate(self, record_id):
+        """Drop the fragment for a record, e.g. when it is deleted."""
+        with self._lock:
+            key = self._by_id.pop(record_id, None)
+            if key is not None:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_id.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,265 @@
+"""
+Background jobs - long-running batch analyses outside the request thread.
+
+Jobs run on a bounded thread pool. Each job moves through
+queued -> running -> done / failed / cancelled, reports progress as it
+works through the history in chunks, and can be cancelled between chunks.
+Status, cancel requests and finished results go through storage, so any
+worker process can report on or cancel a job another one is running, and
+results survive a restart.
+"""
+
+import csv
+import io
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from calculator import calculate, parse_row
+from storage import (load_calculations, apply_change, add_calculations, save_job_result, load_job_result,
+                     save_job_status, load_job_status, list_job_statuses, request_job_cancel,
+                     job_cancel_requested, delete_job, generate_id, DEFAULT_WORKSPACE)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+MAX_WORKERS = 2
+MAX_PENDING = 16
+MAX_HISTORY = 200
+CHUNK_SIZE = 5000
+# Minimum seconds between stored progress updates
+STATUS_INTERVAL = 0.5
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation has been requested."""
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting to run."""
+
+
+class Job:
+    """A single background job and its progress."""
+
+    def __init__(self, kind, params):
+        self.id = generate_id()
+        self.kind = kind
+        self.params = params
+        self.state = QUEUED
+        self.progress = 0.0
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._future = None
+        self._saved = 0.0
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set() or job_cancel_requested(self.id)
+
+    def check_cancelled(self):
+        """Stop the job here if someone asked to cancel it."""
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    def report(self, done, total):
+        """Record progress as done out of total work items."""
+        self.progress = 1.0 if total <= 0 else min(done / total, 1.0)
+        if time.time() - self._saved >= STATUS_INTERVAL:
+            self.save()
+
+    def save(self):
+        """Store the current status for other worker processes."""
+        self._saved = time.time()
+        save_job_status(self.id, self.to_dict())
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'workspace': self.params.get('workspace', DEFAULT_WORKSPACE),
+            'state': self.state,
+            'progress': round(self.progress, 4),
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+def _in_chunks(job, records, fn):
+    """Run fn over records chunk by chunk, reporting progress and honouring cancel."""
+    results = []
+    total = len(records)
+    for start in range(0, total, CHUNK_SIZE):
+        job.check_cancelled()
+        results.extend(fn(records[start:start + CHUNK_SIZE]))
+        job.report(min(start + CHUNK_SIZE, total), total)
+    return results
+
+
+def reprice_job(job, workspace=DEFAULT_WORKSPACE, model="linear", elasticity=1.5, points=None, max_price=None):
+    """Find the profit-maximizing price for every saved calculation."""
+    from demand import optimize_calculations
+    return _in_chunks(job, load_calculations(workspace),
+                      lambda chunk: optimize_calculations(chunk, model, elasticity, points, max_price))
+
+
+def sensitivity_job(job, workspace=DEFAULT_WORKSPACE, swing=10, output="gross_profit"):
+    """Tornado tables for every saved calculation."""
+    from sensitivity import tornado
+    return _in_chunks(job, load_calculations(workspace), lambda chunk: tornado(chunk, swing, output))
+
+
+def projection_job(job, workspace=DEFAULT_WORKSPACE, **options):
+    """Monthly projection summary for every saved calculation."""
+    from projection import project, projection_summary
+    return _in_chunks(job, load_calculations(workspace),
+                      lambda chunk: projection_summary(chunk, project(chunk, **options)))
+
+
+def import_csv_job(job, workspace=DEFAULT_WORKSPACE, csv_text=""):
+    """Import calculations from CSV text with one input field per column.
+
+    Rows already saved (or repeated in the CSV) are folded in as duplicates,
+    as for POST /bulk/save.
+    """
+    rows = list(csv.DictReader(io.StringIO(csv_text)))
+    imported = []
+    for i, row in enumerate(rows):
+        if i % CHUNK_SIZE == 0:
+            job.check_cancelled()
+            job.report(i, len(rows))
+        result = calculate(parse_row(row)).to_dict()
+        result['id'] = generate_id()
+        imported.append(result)
+
+    job.check_cancelled()
+    added = apply_change(lambda calculations: add_calculations(calculations, imported), workspace)
+    job.report(1, 1)
+    return {'imported': len(added), 'duplicates': len(imported) - len(added)}
+
+
+JOB_KINDS = {
+    "reprice": reprice_job,
+    "sensitivity": sensitivity_job,
+    "projection": projection_job,
+    "import_csv": import_csv_job,
+}
+
+
+class JobQueue:
+    """Bounded pool of background workers with job bookkeeping."""
+
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING, max_history=MAX_HISTORY):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self._executor = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Created on first use so importing the app doesn't start threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        return self._executor
+
+    def submit(self, kind, params=None):
+        """Queue a job and return it. Raises ValueError or JobQueueFull."""
+        if kind not in JOB_KINDS:
+            raise ValueError("unknown job kind: %s" % kind)
+
+        job = Job(kind, params or {})
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j.state in (QUEUED, RUNNING))
+            if pending >= self.max_pending:
+                raise JobQueueFull("too many jobs in progress, try again later")
+            self._jobs[job.id] = job
+            self._trim()
+            job.save()
+            job._future = self._pool().submit(self._run, job)
+        return job
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond max_history, here and in storage."""
+        finished = [job_id for job_id, j in self._jobs.items() if j.state in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self._jobs[job_id]
+
+        stored = sorted((status for status in list_job_statuses() if status['state'] in FINISHED_STATES),
+                        key=lambda status: status['created'])
+        for status in stored[:max(0, len(stored) - self.max_history)]:
+            delete_job(status['id'])
+
+    def _run(self, job):
+        if job.cancel_requested:
+            job.state = CANCELLED
+            job.finished = time.time()
+            job.save()
+            return
+
+        job.state = RUNNING
+        job.started = time.time()
+        job.save()
+        try:
+            result = JOB_KINDS[job.kind](job, **job.params)
+            save_job_result(job.id, result)
+            job.progress = 1.0
+            job.state = DONE
+        except JobCancelled:
+            job.state = CANCELLED
+        except Exception as e:
+            job.error = "%s: %s" % (type(e).__name__, e)
+            job.state = FAILED
+        finally:
+            job.finished = time.time()
+            job.save()
+
+    def get(self, job_id):
+        """Return the job with this id if it runs in this process, or None."""
+        return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """Status dict of a job run by any worker process, or None if unknown."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return load_job_status(job_id)
+
+    def cancel(self, job_id):
+        """Ask a job to stop. Returns its status, or None if unknown."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            status = load_job_status(job_id)
+            if status is not None and status['state'] not in FINISHED_STATES:
+                # Running in another process; it checks for this between chunks
+                request_job_cancel(job_id)
+            return status
+        job._cancel.set()
+        if job._future is not None and job._future.cancel():
+            job.state = CANCELLED
+            job.finished = time.time()
+            job.save()
+        return job.to_dict()
+
+    def result(self, job_id):
+        """Return the stored result of a finished job, or None."""
+        return load_job_result(job_id)
+
+    def list(self):
+        """Jobs of every worker process, newest first (at most max_history)."""
+        statuses = {status['id']: status for status in list_job_statuses()}
+        for job in self._jobs.values():
+            statuses[job.id] = job.to_dict()
+        newest = sorted(statuses.values(), key=lambda status: status['created'], reverse=True)
+        return newest[:self.max_history]
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Load test - replay a mix of requests and report latency per route.
+
+Runs against the app in-process through the Flask test client (default)
+or against a running instance with --url. The history is seeded with
+synthetic records first, in a workspace whose name must start with
+"loadtest" (the mix deletes records at random, so it never touches real
+data), then a weighted mix of index / calculate / save / compare /
+delete requests is sent either by a fixed number of concurrent users
+(closed loop) or at a fixed request rate (open loop, --rate). In rate
+mode latency is measured from when a request was due, so a server that
+falls behind shows it in the percentiles.
+
+    python loadtest.py --seed 10000 --concurrency 8 --duration 30
+    python loadtest.py --url http://127.0.0.1:8080 --rate 50 --duration 60 --json report.json
+    python loadtest.py --mix index=50,calculate=30,save=20 --requests 2000
+
+Prints a text summary; --json also writes the report as JSON (- for stdout).
+Afterwards the records the run created are deleted again by id, unless
+--keep is given.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from calculator import calculate
+
+ROUTES = ("index", "calculate", "save", "compare", "delete")
+DEFAULT_MIX = {"index": 40, "calculate": 30, "save": 15, "compare": 10, "delete": 5}
+DEFAULT_WORKSPACE = "loadtest"
+SEED_BATCH = 1000
+PERCENTILES = (50, 95, 99)
+
+
+def parse_mix(text):
+    """Parse "index=40,calculate=30" into route weights."""
+    mix = {}
+    for part in filter(None, text.split(",")):
+        route, _, weight = part.partition("=")
+        if route not in ROUTES:
+            raise ValueError("unknown route %r; choose from %s" % (route, ", ".join(ROUTES)))
+        mix[route] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("the mix needs at least one route with a positive weight")
+    return mix
+
+
+def synthetic_inputs(rng, i):
+    """Random but plausible calculator inputs for product i."""
+    return {
+        "name": "Load test product %d" % i,
+        "units": rng.randint(1, 5000),
+        "product_cost": round(rng.uniform(1, 50), 2),
+        "transportation": round(rng.uniform(0, 5), 2),
+        "tax": round(rng.uniform(0, 3), 2),
+        "other_costs": round(rng.uniform(0, 2), 2),
+        "staff_salary": round(rng.uniform(0, 20000), 2),
+        "rent": round(rng.uniform(0, 5000), 2),
+        "utilities": round(rng.uniform(0, 1000), 2),
+        "marketing": round(rng.uniform(0, 3000), 2),
+        "selling_price": round(rng.uniform(0, 120), 2),
+        "target_margin": rng.choice([20, 30, 40]),
+    }
+
+
+def synthetic_result(rng, i):
+    """A saved-calculation record like the result view produces."""
+    inputs = synthetic_inputs(rng, i)
+    result = calculate(inputs).to_dict()
+    result["id"] = "load-%d-%d" % (i, rng.randrange(10 ** 9))
+    result["other_cost_name"] = ""
+    return result
+
+
+class ClientTarget:
+    """Sends requests to the app in this process through the Flask test client."""
+
+    def __init__(self, workspace):
+        from app import app
+        self.app = app
+        self.headers = {"X-Workspace": workspace}
+        self._local = threading.local()
+
+    def request(self, method, path, form=None, body=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, data=form, json=body, headers=self.headers)
+        return response.status_code, response.get_json(silent=True) if body is not None else None
+
+
+class HttpTarget:
+    """Sends requests to a running instance over HTTP."""
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url, workspace, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"X-Workspace": workspace}
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(self._NoRedirect)
+
+    def request(self, method, path, form=None, body=None):
+        headers = dict(self.headers)
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        elif form is not None:
+            data = urllib.parse.urlencode(form, doseq=True).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                payload = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            payload = e.read()
+            status = e.code
+        parsed = None
+        if body is not None:
+            try:
+                parsed = json.loads(payload)
+            except ValueError:
+                pass
+        return status, parsed
+
+
+def seed(target, count, rng):
+    """Add count synthetic records; returns their ids."""
+    ids = []
+    for start in range(0, count, SEED_BATCH):
+        batch = [synthetic_result(rng, i) for i in range(start, min(start + SEED_BATCH, count))]
+        status, _ = target.request("POST", "/bulk/save", body={"results": batch})
+        if status >= 400:
+            raise RuntimeError("seeding failed (HTTP %d)" % status)
+        ids.extend(record["id"] for record in batch)
+    return ids
+
+
+def cleanup(target, ids):
+    """Delete the records this run created, by id."""
+    ids = list(ids)
+    for start in range(0, len(ids), SEED_BATCH):
+        target.request("POST", "/bulk/delete", body={"ids": ids[start:start + SEED_BATCH]})
+
+
+class Workload:
+    """Builds the next request of the mix and tracks roughly how many records exist."""
+
+    def __init__(self, mix, records, rng):
+        self.routes = list(mix)
+        self.weights = [mix[route] for route in self.routes]
+        self.records = records
+        self.rng = rng
+        self.lock = threading.Lock()
+        self.counter = 0
+        self.saved_ids = []
+
+    def next_request(self):
+        """Returns (route, method, path, form)."""
+        with self.lock:
+            route = self.rng.choices(self.routes, self.weights)[0]
+            self.counter += 1
+            n = self.counter
+            records = self.records
+            if route == "save":
+                self.records += 1
+            elif route == "delete" and self.records > 0:
+                self.records -= 1
+            pick = [self.rng.randrange(max(records, 1)) for _ in range(2)]
+            inputs = synthetic_inputs(self.rng, 1000000 + n)
+            result = synthetic_result(self.rng, 1000000 + n) if route == "save" else None
+            if result is not None:
+                self.saved_ids.append(result["id"])
+
+        if route == "index":
+            return route, "GET", "/", None
+        if route == "calculate":
+            return route, "POST", "/calculate", {k: str(v) for k, v in inputs.items()}
+        if route == "save":
+            return route, "POST", "/save", {"result_data": json.dumps(result)}
+        if route == "compare":
+            return route, "POST", "/compare", {"compare": [str(pick[0]), str(pick[1])]}
+        return route, "POST", "/delete/%d" % pick[0], None
+
+
+class Recorder:
+    """Latencies and errors per route."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def record(self, route, seconds, status):
+        with self.lock:
+            self.latencies.setdefault(route, []).append(seconds * 1000)
+            key = str(status)
+            self.statuses.setdefault(route, {})
+            self.statuses[route][key] = self.statuses[route].get(key, 0) + 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(-(-pct * len(sorted_values) // 100)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, errors, statuses, elapsed):
+    values = sorted(latencies)
+    count = len(values)
+    summary = {
+        "requests": count,
+        "errors": errors,
+        "error_rate": errors / count if count else 0.0,
+        "throughput": count / elapsed if elapsed > 0 else 0.0,
+        "mean_ms": sum(values) / count if count else None,
+        "max_ms": values[-1] if values else None,
+        "statuses": statuses,
+    }
+    for pct in PERCENTILES:
+        summary["p%d_ms" % pct] = percentile(values, pct)
+    return summary
+
+
+def run(target, workload, concurrency=4, duration=None, requests=None, rate=None):
+    """Send the workload until duration seconds pass or requests are sent.
+
+    With rate, requests are started at that many per second by a pool of
+    concurrency threads; otherwise concurrency users each send their next
+    request as soon as the last one finishes. Returns the report dict.
+    """
+    if duration is None and requests is None:
+        raise ValueError("give a duration or a number of requests")
+    recorder = Recorder()
+    sent = [0]
+    sent_lock = threading.Lock()
+
+    def take():
+        with sent_lock:
+            if requests is not None and sent[0] >= requests:
+                return False
+            sent[0] += 1
+            return True
+
+    def send(due):
+        route, method, path, form = workload.next_request()
+        try:
+            status, _ = target.request(method, path, form=form)
+        except Exception as e:
+            status = type(e).__name__
+        recorder.record(route, time.perf_counter() - due, status)
+
+    started = time.perf_counter()
+    deadline = started + duration if duration is not None else None
+
+    if rate:
+        interval = 1.0 / rate
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            i = 0
+            while take():
+                due = started + i * interval
+                if deadline is not None and due >= deadline:
+                    break
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(send, due)
+                i += 1
+    else:
+        def user():
+            while (deadline is None or time.perf_counter() < deadline) and take():
+                send(time.perf_counter())
+
+        threads = [threading.Thread(target=user) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    elapsed = time.perf_counter() - started
+    routes = {}
+    all_latencies = []
+    all_statuses = {}
+    for route, latencies in sorted(recorder.latencies.items()):
+        routes[route] = summarize(latencies, recorder.errors.get(route, 0), recorder.statuses[route], elapsed)
+        all_latencies.extend(latencies)
+        for status, n in recorder.statuses[route].items():
+            all_statuses[status] = all_statuses.get(status, 0) + n
+    return {
+        "mode": "rate" if rate else "concurrency",
+        "concurrency": concurrency,
+        "rate": rate,
+        "seconds": round(elapsed, 3),
+        "total": summarize(all_latencies, sum(recorder.errors.values()), all_statuses, elapsed),
+        "routes": routes,
+    }
+
+
+def format_report(report):
+    """Text table of a run() report."""
+    def ms(value):
+        return "%9.1f" % value if value is not None else "%9s" % "-"
+
+    header = "%-10s %8s %9s %7s %9s %9s %9s %9s" % (
+        "route", "requests", "req/s", "errors", "p50 ms", "p95 ms", "p99 ms", "max ms")
+    lines = [
+        "%s, %s in %.1f s" % (
+            "rate %g/s" % report["rate"] if report["mode"] == "rate" else "%d users" % report["concurrency"],
+            "%d requests" % report["total"]["requests"], report["seconds"]),
+        header,
+        "-" * len(header),
+    ]
+    rows = list(report["routes"].items()) + [("total", report["total"])]
+    for route, s in rows:
+        lines.append("%-10s %8d %9.1f %6.1f%% %s %s %s %s" % (
+            route, s["requests"], s["throughput"], s["error_rate"] * 100,
+            ms(s["p50_ms"]), ms(s["p95_ms"]), ms(s["p99_ms"]), ms(s["max_ms"])))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the calculator web app")
+    parser.add_argument("--url", help="base URL of a running instance (default: in-process test client)")
+    parser.add_argument("--workspace", default=DEFAULT_WORKSPACE, help="workspace to seed and test")
+    parser.add_argument("--seed", type=int, default=1000, help="synthetic records to start with")
+    parser.add_argument("--keep", action="store_true", help="leave the records this run created in place")
+    parser.add_argument("--mix", default=",".join("%s=%g" % item for item in DEFAULT_MIX.items()),
+                        help="route weights, e.g. index=40,calculate=30,save=15,compare=10,delete=5")
+    parser.add_argument("--concurrency", type=int, default=4, help="users, or threads in rate mode")
+    parser.add_argument("--rate", type=float, help="requests per second (open loop)")
+    parser.add_argument("--duration", type=float, help="seconds to run")
+    parser.add_argument("--requests", type=int, help="requests to send")
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="write the report as JSON (- for stdout)")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.duration is None and args.requests is None:
+        args.duration = 10.0
+
+    if not args.workspace.startswith(DEFAULT_WORKSPACE):
+        # The mix deletes records at random, so never point it at real data
+        parser.error("the workspace name must start with %r" % DEFAULT_WORKSPACE)
+
+    rng = random.Random(args.random_seed)
+    target = HttpTarget(args.url, args.workspace) if args.url else ClientTarget(args.workspace)
+
+    started = time.perf_counter()
+    seeded_ids = seed(target, args.seed, rng)
+    seeded_in = time.perf_counter() - started
+
+    workload = Workload(mix, args.seed, rng)
+    try:
+        report = run(target, workload, args.concurrency, args.duration, args.requests, args.rate)
+    finally:
+        if not args.keep:
+            cleanup(target, seeded_ids + workload.saved_ids)
+    report["target"] = args.url or "test client"
+    report["workspace"] = args.workspace
+    report["seeded"] = args.seed
+    report["seed_seconds"] = round(seeded_in, 3)
+
+    if args.json_path == "-":
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print("Seeded %d records in %.1f s" % (args.seed, seeded_in))
+        print(format_report(report))
+        if args.json_path:
+            with open(args.json_path, "w") as f:
+                json.dump(report, f, indent=2)
+    return 1 if report["total"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
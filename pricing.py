@@ -0,0 +1,138 @@
+"""
+Pricing ladders over many records - BusinessCalculator.pricing_ladder() in one pass.
+
+Every record's cost per unit is computed once, and the rung prices for
+all records come from one broadcast over a (records x rungs) array, so a
+rate card for thousands of SKUs costs about as much as a single row.
+"""
+
+import numpy as np
+
+from calculator import DEFAULT_MARGINS, DEFAULT_MARKUPS
+from vectorized import fixed_costs, to_arrays, variable_cost_per_unit
+
+MAX_RUNGS = 100
+
+
+def number_list(values, name):
+    """A list or tuple of finite numbers as a list of floats."""
+    if not isinstance(values, (list, tuple)):
+        raise ValueError("%s must be a list of numbers" % name)
+    numbers = []
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+            raise ValueError("%s must be a list of finite numbers" % name)
+        numbers.append(float(value))
+    return numbers
+
+
+def validate_rungs(margins, markups):
+    """Check margin and markup lists; returns them as lists of floats."""
+    margins = number_list(margins, "margins")
+    markups = number_list(markups, "markups")
+    if any(m >= 100 for m in margins):
+        raise ValueError("margins must be below 100%")
+    if any(m <= -100 for m in markups):
+        raise ValueError("markups must be above -100%")
+    if not margins and not markups:
+        raise ValueError("give at least one margin or markup")
+    if len(margins) + len(markups) > MAX_RUNGS:
+        raise ValueError("at most %d margins and markups" % MAX_RUNGS)
+    return margins, markups
+
+
+def rung_labels(margins, markups):
+    """Column names for the rungs, e.g. margin_20, markup_50."""
+    return ["margin_%g" % m for m in margins] + ["markup_%g" % m for m in markups]
+
+
+def ladder(arrays, margins=DEFAULT_MARGINS, markups=DEFAULT_MARKUPS):
+    """Pricing ladder for every record at once.
+
+    arrays is vectorized.to_arrays() output. Returns (records x rungs)
+    arrays for price, profit_per_unit, profit and breakeven_units (inf
+    where a price does not cover the variable cost), plus each record's
+    cost_per_unit.
+    """
+    margins, markups = validate_rungs(margins, markups)
+    units = arrays["units"]
+    fixed = fixed_costs(arrays)
+    variable = variable_cost_per_unit(arrays)
+    total = fixed + variable * units
+    cost_per_unit = np.divide(total, units, out=np.zeros_like(total), where=units > 0)
+
+    # One factor per rung: price = cost_per_unit * factor
+    factors = np.concatenate((1 / (1 - np.asarray(margins) / 100), 1 + np.asarray(markups) / 100))
+    price = cost_per_unit[:, None] * factors[None, :]
+    profit_per_unit = price - cost_per_unit[:, None]
+    contribution = price - variable[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        breakeven_units = np.where(contribution > 0, fixed[:, None] / contribution, np.inf)
+
+    return {
+        "cost_per_unit": cost_per_unit,
+        "price": price,
+        "profit_per_unit": profit_per_unit,
+        "profit": profit_per_unit * units[:, None],
+        "breakeven_units": breakeven_units,
+    }
+
+
+def implied_rates(arrays, price=None):
+    """Margin and markup (percent) per record at the given prices.
+
+    price defaults to each record's selling price; a scalar applies the
+    same price to every record.
+    """
+    units = arrays["units"]
+    total = fixed_costs(arrays) + variable_cost_per_unit(arrays) * units
+    cost_per_unit = np.divide(total, units, out=np.zeros_like(total), where=units > 0)
+    price = arrays["selling_price"] if price is None else np.broadcast_to(np.asarray(price, dtype=float), units.shape)
+    profit_per_unit = price - cost_per_unit
+    return {
+        "price": price,
+        "margin": np.divide(profit_per_unit * 100, price, out=np.zeros_like(profit_per_unit), where=price > 0),
+        "markup": np.divide(profit_per_unit * 100, cost_per_unit, out=np.zeros_like(profit_per_unit),
+                            where=cost_per_unit > 0),
+    }
+
+
+def _finite(values):
+    return [v if np.isfinite(v) else None for v in values.tolist()]
+
+
+def rate_card(records, margins=DEFAULT_MARGINS, markups=DEFAULT_MARKUPS):
+    """One row per record: its rung prices, profit at its current volume and
+    break-even units, plus the margin and markup its current selling price
+    gives.
+
+    Non-finite break-even units (price below variable cost) are None.
+    """
+    margins, markups = validate_rungs(margins, markups)
+    labels = rung_labels(margins, markups)
+    if not records:
+        return {'rungs': labels, 'rows': []}
+
+    arrays = to_arrays(records)
+    rungs = ladder(arrays, margins, markups)
+    current = implied_rates(arrays)
+
+    prices = rungs["price"].tolist()
+    profits = rungs["profit"].tolist()
+    cost_per_unit = rungs["cost_per_unit"].tolist()
+    margin = current["margin"].tolist()
+    markup = current["markup"].tolist()
+    rows = []
+    for i, record in enumerate(records):
+        rows.append({
+            'id': record.get('id'),
+            'name': record.get('name', 'Untitled'),
+            'cost_per_unit': cost_per_unit[i],
+            'selling_price': float(arrays["selling_price"][i]),
+            'margin': margin[i],
+            'markup': markup[i],
+            'prices': dict(zip(labels, prices[i])),
+            'profit': dict(zip(labels, profits[i])),
+            'breakeven_units': dict(zip(labels, _finite(rungs["breakeven_units"][i]))),
+        })
+    return {'rungs': labels, 'rows': rows}
@@ -0,0 +1,154 @@
+"""
+Request profiler - opt-in cProfile sampling and a slow-request log.
+
+Every request gets a cheap phase breakdown (storage / compute / render)
+from the phase() blocks in the routes. A request is also run under
+cProfile when it carries the admin header with the right token, or when
+the sampling rate picks it; the hottest functions are kept per route in a
+small ring buffer for the admin endpoint. Requests slower than the
+threshold are logged with their phase breakdown as one JSON line.
+
+Configured through environment variables:
+
+  PROFILE_TOKEN        admin token; enables the header and /admin/profiles
+  PROFILE_SAMPLE_RATE  fraction of requests to profile (default 0)
+  SLOW_REQUEST_MS      slow-request log threshold (default 500)
+"""
+
+import cProfile
+import hmac
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import g
+
+PROFILE_HEADER = "X-Profile-Token"
+TOP_FUNCTIONS = 15
+PROFILES_PER_ROUTE = 20
+
+logger = logging.getLogger("business_calculator.slow_requests")
+
+
+class ProfileSettings:
+    """Profiler settings, read from the environment by default."""
+
+    def __init__(self, token=None, sample_rate=None, slow_ms=None):
+        self.token = token if token is not None else os.environ.get("PROFILE_TOKEN", "")
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+        self.slow_ms = slow_ms if slow_ms is not None else float(os.environ.get("SLOW_REQUEST_MS", 500))
+
+    def is_admin(self, headers):
+        # Constant-time comparison, so response timing doesn't leak the token
+        return bool(self.token) and hmac.compare_digest(headers.get(PROFILE_HEADER, "").encode(), self.token.encode())
+
+
+settings = ProfileSettings()
+
+_profiles = {}
+_profiles_lock = threading.Lock()
+# Only one cProfile session can be active per process at a time
+_profiler_busy = threading.Lock()
+
+
+def start(headers):
+    """Begin timing the current request; profile it if asked or sampled."""
+    g.request_started = time.perf_counter()
+    g.request_phases = {}
+    g.request_profile = None
+
+    wanted = settings.is_admin(headers) or (settings.sample_rate > 0 and random.random() < settings.sample_rate)
+    if wanted and _profiler_busy.acquire(blocking=False):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            _profiler_busy.release()
+            return
+        g.request_profile = profile
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to the named phase of this request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases = g.get("request_phases")
+        if phases is not None:
+            phases[name] = phases.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+
+def _top_functions(profile, limit=TOP_FUNCTIONS):
+    stats = pstats.Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    top = []
+    for (filename, line, func), (_, calls, self_time, cumulative, _) in rows:
+        top.append({
+            'function': "%s:%d(%s)" % (os.path.basename(filename), line, func),
+            'calls': calls,
+            'self_ms': round(self_time * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        })
+    return top
+
+
+def finish(route, method, path, status):
+    """Stop timing; store the profile and log the request if it was slow."""
+    started = g.get("request_started")
+    if started is None:
+        return
+    total_ms = (time.perf_counter() - started) * 1000
+
+    phases = {name: round(ms, 3) for name, ms in g.request_phases.items()}
+    phases['other'] = round(max(total_ms - sum(phases.values()), 0.0), 3)
+
+    profile = g.get("request_profile")
+    if profile is not None:
+        profile.disable()
+        g.request_profile = None
+        _profiler_busy.release()
+        entry = {
+            'time': time.time(),
+            'method': method,
+            'path': path,
+            'status': status,
+            'total_ms': round(total_ms, 3),
+            'phases': phases,
+            'top': _top_functions(profile),
+        }
+        with _profiles_lock:
+            _profiles.setdefault(route, deque(maxlen=PROFILES_PER_ROUTE)).append(entry)
+
+    if total_ms >= settings.slow_ms:
+        logger.warning(json.dumps({
+            'event': 'slow_request',
+            'route': route,
+            'method': method,
+            'path': path,
+            'status': status,
+            'total_ms': round(total_ms, 3),
+            'phases': phases,
+        }))
+
+
+def abandon():
+    """Release the profiler if a request ended without finish() (e.g. an error)."""
+    profile = g.get("request_profile")
+    if profile is not None:
+        profile.disable()
+        g.request_profile = None
+        _profiler_busy.release()
+
+
+def recent_profiles():
+    """Stored profiles per route, newest first."""
+    with _profiles_lock:
+        return {route: list(reversed(entries)) for route, entries in _profiles.items()}
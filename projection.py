@@ -0,0 +1,122 @@
+"""
+Projection module - monthly multi-period projections with cumulative cash flow.
+
+Each record is treated as one month of business: its fixed costs are the
+monthly fixed costs and its units are the units sold in month 1. Every
+input is broadcast over a (products x months) grid so a whole history is
+projected in one call.
+"""
+
+import numpy as np
+
+from vectorized import to_arrays, fixed_costs, variable_cost_per_unit
+
+MIN_MONTHS = 1
+MAX_MONTHS = 60
+
+
+def _per_product(value, count):
+    """Broadcast a scalar or per-product sequence to a column vector."""
+    return np.broadcast_to(np.asarray(value, dtype=float).reshape(-1, 1), (count, 1))
+
+
+def _one_off_matrix(one_off_costs, count, months):
+    """Build a (products x months) matrix of one-off fixed costs.
+
+    Accepts a {month: amount} dict (1-based months, applied to every
+    product) or anything broadcastable to (products, months).
+    """
+    if one_off_costs is None:
+        return np.zeros((count, months))
+    if isinstance(one_off_costs, dict):
+        row = np.zeros(months)
+        for month, amount in one_off_costs.items():
+            if 1 <= int(month) <= months:
+                row[int(month) - 1] += float(amount)
+        return np.broadcast_to(row, (count, months))
+    return np.broadcast_to(np.asarray(one_off_costs, dtype=float), (count, months))
+
+
+def project(records, months=12, unit_growth=0, price_change=0, cost_inflation=0,
+            one_off_costs=None, initial_investment=0, discount_rate=0):
+    """Project saved calculations month by month.
+
+    Rates are percentages, matching the rest of the calculator: unit_growth,
+    price_change and cost_inflation are per month, discount_rate is per year.
+    Rates and initial_investment may be scalars or one value per record.
+
+    Returns a dict of arrays. Monthly series have shape (products, months);
+    payback_month (1-based, NaN if never reached) and npv have one value
+    per product.
+    """
+    if not MIN_MONTHS <= months <= MAX_MONTHS:
+        raise ValueError("months must be between %d and %d" % (MIN_MONTHS, MAX_MONTHS))
+
+    arrays = to_arrays(records)
+    count = len(records)
+    steps = np.arange(months)
+
+    unit_factor = (1 + _per_product(unit_growth, count) / 100) ** steps
+    price_factor = (1 + _per_product(price_change, count) / 100) ** steps
+    cost_factor = (1 + _per_product(cost_inflation, count) / 100) ** steps
+
+    units = arrays["units"][:, None] * unit_factor
+    price = arrays["selling_price"][:, None] * price_factor
+    variable = variable_cost_per_unit(arrays)[:, None] * cost_factor * units
+    fixed = fixed_costs(arrays)[:, None] * cost_factor + _one_off_matrix(one_off_costs, count, months)
+
+    revenue = price * units
+    costs = variable + fixed
+    profit = revenue - costs
+
+    investment = _per_product(initial_investment, count)[:, 0]
+    cumulative_cash = np.cumsum(profit, axis=1) - investment[:, None]
+
+    # First month where cumulative cash is non-negative
+    recovered = cumulative_cash >= 0
+    payback_month = np.where(recovered.any(axis=1), recovered.argmax(axis=1) + 1.0, np.nan)
+
+    monthly_rate = (1 + _per_product(discount_rate, count)[:, 0] / 100) ** (1 / 12) - 1
+    discount = (1 + monthly_rate[:, None]) ** -(steps + 1.0)
+    npv = (profit * discount).sum(axis=1) - investment
+
+    return {
+        "months": steps + 1,
+        "units": units,
+        "revenue": revenue,
+        "costs": costs,
+        "profit": profit,
+        "cumulative_cash": cumulative_cash,
+        "payback_month": payback_month,
+        "npv": npv,
+    }
+
+
+def projection_rows(projection, index=0):
+    """Return one product's projection as a list of month dicts for display."""
+    rows = []
+    for m, month in enumerate(projection["months"]):
+        rows.append({
+            'month': int(month),
+            'units': float(projection["units"][index, m]),
+            'revenue': float(projection["revenue"][index, m]),
+            'costs': float(projection["costs"][index, m]),
+            'profit': float(projection["profit"][index, m]),
+            'cumulative_cash': float(projection["cumulative_cash"][index, m]),
+        })
+    return rows
+
+
+def projection_summary(records, projection):
+    """Return per-record payback month and NPV alongside the record name."""
+    summary = []
+    for i, record in enumerate(records):
+        payback = projection["payback_month"][i]
+        summary.append({
+            'name': record.get('name', 'Untitled'),
+            'total_profit': float(projection["profit"][i].sum()),
+            'final_cash': float(projection["cumulative_cash"][i, -1]),
+            'payback_month': None if np.isnan(payback) else int(payback),
+            'npv': float(projection["npv"][i]),
+        })
+    return summary
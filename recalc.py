@@ -0,0 +1,127 @@
+"""
+Incremental recalculation - a dependency graph over the calculator metrics.
+
+Given a previous state (inputs plus computed outputs) and a delta of
+changed inputs, only the outputs downstream of those inputs are recomputed.
+The formulas mirror BusinessCalculator, including the form's behaviour of
+auto-pricing from target_margin when selling_price is 0.
+"""
+
+from calculator import FIXED_COST_FIELDS, VARIABLE_COST_FIELDS, INPUT_FIELDS, parse_form
+
+
+def _cost_per_unit(v):
+    if v["units"] <= 0:
+        return 0
+    return v["total_costs"] / v["units"]
+
+
+def _effective_price(v):
+    # Same rule as /calculate: a price of 0 means "price for target margin"
+    if v["selling_price"] != 0:
+        return v["selling_price"]
+    if v["target_margin"] >= 100:
+        return float('inf')
+    return v["cost_per_unit"] / (1 - v["target_margin"] / 100)
+
+
+def _profit_margin(v):
+    if v["total_revenue"] <= 0:
+        return 0
+    return (v["gross_profit"] / v["total_revenue"]) * 100
+
+
+def _markup_percentage(v):
+    if v["cost_per_unit"] <= 0:
+        return 0
+    return ((v["effective_price"] - v["cost_per_unit"]) / v["cost_per_unit"]) * 100
+
+
+def _units_to_breakeven(v):
+    contribution = v["effective_price"] - v["variable_cost_per_unit"]
+    if contribution <= 0:
+        return float('inf')
+    return v["total_fixed_costs"] / contribution
+
+
+# output -> (dependencies, formula); listed in evaluation order
+GRAPH = {
+    "variable_cost_per_unit": (VARIABLE_COST_FIELDS, lambda v: sum(v[f] for f in VARIABLE_COST_FIELDS)),
+    "total_fixed_costs": (FIXED_COST_FIELDS, lambda v: sum(v[f] for f in FIXED_COST_FIELDS)),
+    "total_variable_costs": (("variable_cost_per_unit", "units"), lambda v: v["variable_cost_per_unit"] * v["units"]),
+    "total_costs": (("total_fixed_costs", "total_variable_costs"), lambda v: v["total_fixed_costs"] + v["total_variable_costs"]),
+    "cost_per_unit": (("total_costs", "units"), _cost_per_unit),
+    "breakeven_price": (("cost_per_unit",), lambda v: v["cost_per_unit"]),
+    "effective_price": (("selling_price", "target_margin", "cost_per_unit"), _effective_price),
+    "total_revenue": (("effective_price", "units"), lambda v: v["effective_price"] * v["units"]),
+    "gross_profit": (("total_revenue", "total_costs"), lambda v: v["total_revenue"] - v["total_costs"]),
+    "profit_margin": (("gross_profit", "total_revenue"), _profit_margin),
+    "markup_percentage": (("effective_price", "cost_per_unit"), _markup_percentage),
+    "units_to_breakeven": (("effective_price", "variable_cost_per_unit", "total_fixed_costs"), _units_to_breakeven),
+}
+
+OUTPUTS = tuple(GRAPH)
+
+
+def _build_dependents():
+    """Map every node to the outputs that transitively depend on it."""
+    direct = {}
+    for output, (deps, _) in GRAPH.items():
+        for dep in deps:
+            direct.setdefault(dep, set()).add(output)
+
+    dependents = {}
+    for node in INPUT_FIELDS + OUTPUTS:
+        seen = set()
+        stack = list(direct.get(node, ()))
+        while stack:
+            current = stack.pop()
+            if current not in seen:
+                seen.add(current)
+                stack.extend(direct.get(current, ()))
+        dependents[node] = frozenset(seen)
+    return dependents
+
+
+DEPENDENTS = _build_dependents()
+
+
+def _evaluate(state, outputs):
+    """Recompute the given outputs in graph order, updating state in place."""
+    for output in OUTPUTS:
+        if output in outputs:
+            state[output] = GRAPH[output][1](state)
+
+
+def full_state(data):
+    """Build a complete state (inputs and every output) from scratch."""
+    state = parse_form(data)
+    _evaluate(state, OUTPUTS)
+    return state
+
+
+def recalculate(state, delta):
+    """Apply an input delta to a previous state and recompute what it affects.
+
+    Returns (new_state, changed) where changed maps every output whose
+    value actually moved to its new value. A state with a missing or
+    non-numeric output is rebuilt from scratch.
+    """
+    if any(not isinstance(state.get(output), (int, float)) for output in OUTPUTS):
+        state = full_state(state)
+    else:
+        state = dict(state)
+
+    updates = parse_form({**state, **delta})
+    touched = [field for field in delta if field in INPUT_FIELDS and updates[field] != state[field]]
+    for field in touched:
+        state[field] = updates[field]
+
+    affected = set()
+    for field in touched:
+        affected |= DEPENDENTS[field]
+
+    before = {output: state[output] for output in affected}
+    _evaluate(state, affected)
+    changed = {output: state[output] for output in affected if state[output] != before[output]}
+    return state, changed
@@ -0,0 +1,197 @@
+"""
+Search index - find saved calculations by name without scanning them.
+
+Names are lowercased and indexed two ways:
+
+  - a sorted list of (name, id) pairs, for prefix matches by bisection
+  - a trigram index (trigram -> ids), for substring matches: the ids
+    whose names contain every trigram of the query are the candidates,
+    and only those are checked for the full query
+
+Queries shorter than a trigram use the trigrams that contain them.
+
+The index follows storage.calculations_version(): routes that change the
+calculations hand it their added and removed records along with the
+version their commit produced, and anything else (a job import, another
+process writing the file) makes the index rebuild on its next search.
+"""
+
+import bisect
+import threading
+
+from storage import calculations_version, load_calculations
+
+GRAM = 3
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 1000
+MODES = ("substring", "prefix")
+# Substring candidates below 1/SPARSE of all names are sorted outright;
+# above that, walking the sorted names finds the first matches sooner
+SPARSE = 8
+
+SUMMARY_FIELDS = ("units", "selling_price", "total_revenue", "gross_profit", "profit_margin", "cost_per_unit")
+
+
+def normalize(name):
+    return " ".join(str(name or "").split()).casefold()
+
+
+def grams(text):
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+def summary(record):
+    """What a search result shows for a record."""
+    row = {'id': record.get('id'), 'name': record.get('name', 'Untitled')}
+    for field in SUMMARY_FIELDS:
+        row[field] = record.get(field)
+    return row
+
+
+class NameIndex:
+    """Prefix and trigram index over the names of one workspace's calculations."""
+
+    def __init__(self):
+        self.version = None
+        self._lock = threading.Lock()
+        self._names = {}
+        self._records = {}
+        self._sorted = []
+        self._grams = {}
+        self._short = set()
+
+    def __len__(self):
+        return len(self._names)
+
+    def rebuild(self, records, version):
+        with self._lock:
+            self._names = {}
+            self._records = {}
+            self._grams = {}
+            self._short = set()
+            for record in records:
+                self._add(record)
+            self._sorted = sorted((name, key) for key, name in self._names.items())
+            self.version = version
+
+    def apply(self, version, added=(), removed=()):
+        """Apply one commit's changes.
+
+        Only valid on top of the version just before the commit (or the
+        commit itself, when several changes were written together);
+        otherwise the index is marked stale and rebuilt on the next search.
+        """
+        with self._lock:
+            if self.version is None or version not in (self.version, self.version + 1):
+                self.version = None
+                return
+            for record in removed:
+                if not record.get('id'):
+                    self.version = None
+                    return
+                self._remove(record['id'])
+            for record in added:
+                if not record.get('id'):
+                    self.version = None
+                    return
+                self._remove(record['id'])
+                self._add(record)
+                bisect.insort(self._sorted, (self._names[record['id']], record['id']))
+            self.version = version
+
+    def _add(self, record):
+        # Records saved before ids existed are still searchable, by position
+        key = record.get('id') or "#%d" % len(self._names)
+        name = normalize(record.get('name'))
+        self._names[key] = name
+        self._records[key] = record
+        if len(name) < GRAM:
+            self._short.add(key)
+        for gram in grams(name):
+            self._grams.setdefault(gram, set()).add(key)
+
+    def _remove(self, key):
+        name = self._names.pop(key, None)
+        if name is None:
+            return
+        del self._records[key]
+        self._short.discard(key)
+        for gram in grams(name):
+            ids = self._grams.get(gram)
+            if ids is not None:
+                ids.discard(key)
+                if not ids:
+                    del self._grams[gram]
+        i = bisect.bisect_left(self._sorted, (name, key))
+        if i < len(self._sorted) and self._sorted[i] == (name, key):
+            del self._sorted[i]
+
+    def search(self, query, mode="substring", limit=DEFAULT_LIMIT):
+        """Records whose names match the query, case-insensitively.
+
+        Returns (summaries, more): the first limit matches by name, and
+        whether there were more. Both modes stop looking once they have
+        found limit + 1, so broad queries cost no more than narrow ones.
+        """
+        query = normalize(query)
+        with self._lock:
+            if mode == "prefix" or not query:
+                keys = self._prefix(query, limit + 1)
+            else:
+                keys = self._substring(query, limit + 1)
+            return [summary(self._records[key]) for key in keys[:limit]], len(keys) > limit
+
+    def _prefix(self, query, count):
+        start = bisect.bisect_left(self._sorted, (query,))
+        # Every name with the prefix sorts before query + the highest character
+        end = bisect.bisect_left(self._sorted, (query + "\U0010ffff",), start)
+        return [key for _, key in self._sorted[start:min(end, start + count)]]
+
+    def _substring(self, query, count):
+        if len(query) < GRAM:
+            # Any gram containing the query means its names do too
+            candidates = set(self._short).union(*(ids for gram, ids in self._grams.items() if query in gram))
+        else:
+            # Only the rarest trigram's names need checking
+            candidates = min((self._grams.get(gram, set()) for gram in grams(query)), key=len)
+
+        if len(candidates) * SPARSE < len(self._sorted):
+            # Few candidates: check them all and sort the matches
+            found = sorted((self._names[key], key) for key in candidates if query in self._names[key])
+            return [key for _, key in found[:count]]
+
+        # Many candidates: walk the names in order and stop at count matches
+        found = []
+        for name, key in self._sorted:
+            if key in candidates and query in name:
+                found.append(key)
+                if len(found) >= count:
+                    break
+        return found
+
+
+class SearchIndexes:
+    """One NameIndex per workspace, kept in step with storage."""
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _index(self, workspace):
+        with self._lock:
+            index = self._indexes.get(workspace)
+            if index is None:
+                index = self._indexes[workspace] = NameIndex()
+            return index
+
+    def current(self, workspace):
+        """The workspace's index, rebuilt first if it is out of date."""
+        index = self._index(workspace)
+        version = calculations_version(workspace)
+        if index.version != version:
+            index.rebuild(load_calculations(workspace), version)
+        return index
+
+    def applied(self, workspace, version, added=(), removed=()):
+        """Record a commit made through storage.apply_change(with_version=True)."""
+        self._index(workspace).apply(version, added, removed)
@@ -0,0 +1,148 @@
+"""
+Sensitivity analysis - which inputs move profit and margin the most.
+
+gross_profit and profit_margin have simple closed-form partial
+derivatives, so those are computed analytically. Any other metric from
+vectorized.metrics() falls back to central finite differences, evaluated
+for every field and record in one batched pass.
+"""
+
+import numpy as np
+
+from calculator import FIXED_COST_FIELDS, VARIABLE_COST_FIELDS
+from vectorized import to_arrays, metrics, fixed_costs, variable_cost_per_unit
+
+# target_margin only matters when pricing, not for saved results
+SENSITIVITY_FIELDS = ("units", "selling_price") + VARIABLE_COST_FIELDS + FIXED_COST_FIELDS
+
+DEFAULT_OUTPUTS = ("gross_profit", "profit_margin")
+
+
+def _analytic(arrays, output):
+    """Closed-form partial derivatives, or None if the output has none here."""
+    units = arrays["units"]
+    price = arrays["selling_price"]
+    fixed = fixed_costs(arrays)
+    variable = variable_cost_per_unit(arrays)
+
+    if output == "gross_profit":
+        # GP = p*u - F - v*u
+        partials = {"units": price - variable, "selling_price": units.copy()}
+        for field in VARIABLE_COST_FIELDS:
+            partials[field] = -units
+        for field in FIXED_COST_FIELDS:
+            partials[field] = -np.ones_like(units)
+        return partials
+
+    if output == "profit_margin":
+        # m = 100 * (1 - F/(p*u) - v/p), flat at 0 where revenue <= 0
+        revenue = price * units
+        live = revenue > 0
+        safe_price = np.where(live, price, 1.0)
+        safe_units = np.where(live, units, 1.0)
+        safe_revenue = safe_price * safe_units
+        zero = np.zeros_like(units)
+        partials = {
+            "units": np.where(live, 100 * fixed / (safe_revenue * safe_units), zero),
+            "selling_price": np.where(live, 100 * (fixed + variable * units) / (safe_revenue * safe_price), zero),
+        }
+        for field in VARIABLE_COST_FIELDS:
+            partials[field] = np.where(live, -100 / safe_price, zero)
+        for field in FIXED_COST_FIELDS:
+            partials[field] = np.where(live, -100 / safe_revenue, zero)
+        return partials
+
+    return None
+
+
+def _stacked(arrays, fields, shifted):
+    """Broadcast arrays to shifted's (fields, variants, records) shape.
+
+    Slice i of the result replaces fields[i] with shifted[i] and leaves
+    every other input at its base value.
+    """
+    shape = shifted.shape
+    stacked = {name: np.broadcast_to(values, shape).copy() for name, values in arrays.items()}
+    for i, field in enumerate(fields):
+        stacked[field][i] = shifted[i]
+    return stacked
+
+
+def finite_differences(arrays, output, fields=SENSITIVITY_FIELDS):
+    """Central finite-difference partials of any metric, batched over fields."""
+    count = len(arrays["units"])
+    steps = np.empty((len(fields), count))
+    shifted = np.empty((len(fields), 2, count))
+    for i, field in enumerate(fields):
+        base = arrays[field]
+        steps[i] = np.maximum(np.abs(base), 1.0) * 1e-6
+        shifted[i, 0] = base + steps[i]
+        shifted[i, 1] = base - steps[i]
+
+    values = metrics(_stacked(arrays, fields, shifted))[output]
+    slopes = (values[:, 0] - values[:, 1]) / (2 * steps)
+    return {field: slopes[i] for i, field in enumerate(fields)}
+
+
+def derivatives(records, outputs=DEFAULT_OUTPUTS, fields=SENSITIVITY_FIELDS):
+    """Partial derivative of each output with respect to each input field.
+
+    Returns {output: {field: array over records}}.
+    """
+    arrays = to_arrays(records)
+    result = {}
+    for output in outputs:
+        partials = _analytic(arrays, output)
+        if partials is None:
+            partials = finite_differences(arrays, output, fields)
+        result[output] = {field: partials[field] for field in fields}
+    return result
+
+
+def swings(records, swing=10, output="gross_profit", fields=SENSITIVITY_FIELDS):
+    """Evaluate an output with each field moved -swing% and +swing%.
+
+    Every (field, direction, record) combination is evaluated in a single
+    vectorized pass. Returns (base, low, high) where low and high have
+    shape (fields, records).
+    """
+    arrays = to_arrays(records)
+    count = len(records)
+    shifted = np.empty((len(fields), 2, count))
+    for i, field in enumerate(fields):
+        shifted[i, 0] = arrays[field] * (1 - swing / 100)
+        shifted[i, 1] = arrays[field] * (1 + swing / 100)
+
+    values = metrics(_stacked(arrays, fields, shifted))[output]
+    base = metrics(arrays)[output]
+    return base, values[:, 0], values[:, 1]
+
+
+def tornado(records, swing=10, output="gross_profit", fields=SENSITIVITY_FIELDS):
+    """Build tornado-chart tables for every record.
+
+    Returns one list per record of {field, low, high, range} rows sorted
+    by range, largest first, plus the record's base value.
+    """
+    base, low, high = swings(records, swing, output, fields)
+    spread = np.abs(high - low)
+    order = np.argsort(-spread, axis=0, kind="stable")
+
+    tables = []
+    for r, record in enumerate(records):
+        rows = []
+        for i in order[:, r]:
+            rows.append({
+                'field': fields[i],
+                'low': float(low[i, r]),
+                'high': float(high[i, r]),
+                'range': float(spread[i, r]),
+            })
+        tables.append({
+            'name': record.get('name', 'Untitled'),
+            'output': output,
+            'swing': swing,
+            'base': float(base[r]),
+            'rows': rows,
+        })
+    return tables
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Production server - warm up once, then fork workers that share the warm state.
+
+    python serve.py --workers 4 --threads 8 --bind 0.0.0.0:8080
+
+Defaults come from WEB_WORKERS (1), WEB_THREADS (4) and WEB_BIND. The app is
+created (and warmed up, see app.warm_up()) in the parent process before
+gunicorn forks its workers, so the compiled templates, imported modules
+and parsed history are shared copy-on-write and no worker's first request
+pays for them. GET /ready reports when warm-up finished and how long it
+took.
+
+gunicorn is optional (pip install gunicorn, Unix only). Without it this
+falls back to a single threaded Werkzeug process and ignores --workers.
+The equivalent gunicorn command line is:
+
+    gunicorn --preload --workers 4 --threads 8 --bind 0.0.0.0:8080 "app:create_app()"
+"""
+
+import argparse
+import os
+import sys
+
+DEFAULT_BIND = "127.0.0.1:8080"
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def default_workers():
+    # One process by default: more only pay off for CPU-bound traffic, and
+    # each worker keeps its own caches and search indexes
+    return _env_int("WEB_WORKERS", 1)
+
+
+def default_threads():
+    return _env_int("WEB_THREADS", 4)
+
+
+def serve_gunicorn(app, bind, workers, threads, timeout):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", bind)
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("worker_class", "gthread" if threads > 1 else "sync")
+            self.cfg.set("timeout", timeout)
+            self.cfg.set("preload_app", True)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+def serve_werkzeug(app, bind, threads):
+    from werkzeug.serving import run_simple
+
+    host, _, port = bind.rpartition(":")
+    print("gunicorn is not installed; serving from one threaded process", file=sys.stderr)
+    run_simple(host or "127.0.0.1", int(port), app, threaded=threads > 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the calculator web app for production")
+    parser.add_argument("--bind", default=os.environ.get("WEB_BIND", DEFAULT_BIND), help="host:port")
+    parser.add_argument("--workers", type=int, default=default_workers(), help="worker processes")
+    parser.add_argument("--threads", type=int, default=default_threads(), help="threads per worker")
+    parser.add_argument("--timeout", type=int, default=60, help="seconds before a stuck worker is restarted")
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.threads < 1:
+        parser.error("--workers and --threads must be at least 1")
+
+    from app import create_app, warm_state
+
+    app = create_app()
+    print("Warm-up finished in %.2f s (%d records in %d workspaces)"
+          % (warm_state['seconds'], warm_state['records'], warm_state['workspaces']), file=sys.stderr)
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        serve_werkzeug(app, args.bind, args.threads)
+    else:
+        serve_gunicorn(app, args.bind, args.workers, args.threads, args.timeout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
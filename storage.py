@@ -4,10 +4,30 @@ Storage module for JSON data persistence.
 
 import json
 import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 from datetime import datetime
 
+from calculator import content_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, run a single process
+    fcntl = None
+
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 
+# How long the first writer waits for others to join its commit
+GROUP_COMMIT_WINDOW = 0.003
+
+# The default workspace keeps using data/calculations.json
+DEFAULT_WORKSPACE = "default"
+WORKSPACE_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
 
 def ensure_data_dir():
     """Ensure the data directory exists."""
@@ -30,23 +50,416 @@ def load_json(filename):
         return []
 
 
+def write_json(filepath, data):
+    """Write JSON to a temporary file and move it into place.
+
+    Each write gets its own temporary file, so concurrent writers never
+    replace each other's half-written data.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or ".",
+                                    prefix=os.path.basename(filepath) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2, default=str)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
 def save_json(filename, data):
     """Save data to a JSON file."""
     ensure_data_dir()
-    filepath = os.path.join(DATA_DIR, filename)
+    write_json(os.path.join(DATA_DIR, filename), data)
 
-    with open(filepath, "w") as f:
-        json.dump(data, f, indent=2, default=str)
+
+def shard_dirs():
+    """Directories workspace shards are spread over.
+
+    Set WORKSPACE_DIRS to a list of directories (separated like PATH) to
+    put shards on different disks; defaults to data/workspaces.
+    """
+    configured = os.environ.get("WORKSPACE_DIRS", "")
+    dirs = [d for d in configured.split(os.pathsep) if d]
+    return dirs or [os.path.join(DATA_DIR, "workspaces")]
+
+
+def validate_workspace(workspace):
+    """Return the workspace name, or raise ValueError if it isn't usable."""
+    workspace = workspace or DEFAULT_WORKSPACE
+    if not WORKSPACE_NAME.match(workspace):
+        raise ValueError("workspace names may only use letters, digits, - and _")
+    return workspace
+
+
+def workspace_path(workspace=DEFAULT_WORKSPACE):
+    """Path of a workspace's calculations file."""
+    workspace = validate_workspace(workspace)
+    if workspace == DEFAULT_WORKSPACE:
+        return os.path.join(DATA_DIR, "calculations.json")
+    dirs = shard_dirs()
+    base = dirs[zlib.crc32(workspace.encode()) % len(dirs)]
+    return os.path.join(base, workspace, "calculations.json")
+
+
+def list_workspaces():
+    """Names of all workspaces that have saved calculations."""
+    names = {DEFAULT_WORKSPACE}
+    for base in shard_dirs():
+        if os.path.isdir(base):
+            for name in os.listdir(base):
+                if WORKSPACE_NAME.match(name) and os.path.exists(os.path.join(base, name, "calculations.json")):
+                    names.add(name)
+    return sorted(names)
+
+
+class _Shard:
+    """Write lock, parsed-file cache and commit queue for one workspace."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # Open lock file while this process holds the cross-process lock
+        self.lock_file = None
+        self.lock_depth = 0
+        self.stamp = None
+        self.data = []
+        # Bumped whenever the cached data changes, so derived indexes can tell
+        self.version = 0
+        self.queue_lock = threading.Lock()
+        self.pending = []
+        self.leader_waiting = False
+
+
+class _PendingChange:
+    """A change waiting to be applied in the next group commit."""
+
+    def __init__(self, change):
+        self.change = change
+        self.result = None
+        self.error = None
+        self.version = None
+        self.done = threading.Event()
 
 
-def load_calculations():
-    """Load saved calculations."""
-    return load_json("calculations.json")
+_shards = {}
+_shards_lock = threading.Lock()
 
 
-def save_calculations(calculations):
+def _shard(workspace):
+    with _shards_lock:
+        shard = _shards.get(workspace)
+        if shard is None:
+            shard = _shards[workspace] = _Shard()
+        return shard
+
+
+def _file_stamp(filepath):
+    # Every write replaces the file (write_json), so the inode changes even
+    # where timestamps are too coarse to tell two writes apart
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_ctime_ns, stat.st_size)
+
+
+@contextmanager
+def _locked(shard, workspace):
+    """Hold the shard's thread lock and, where fcntl exists, an exclusive
+    flock on the workspace's lock file, so other processes serving the same
+    data wait too. Re-entrant within a process.
+    """
+    with shard.lock:
+        if shard.lock_depth == 0 and fcntl is not None:
+            filepath = workspace_path(workspace) + ".lock"
+            if not os.path.exists(os.path.dirname(filepath)):
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            lock_file = open(filepath, "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            shard.lock_file = lock_file
+        shard.lock_depth += 1
+        try:
+            yield
+        finally:
+            shard.lock_depth -= 1
+            if shard.lock_depth == 0 and shard.lock_file is not None:
+                fcntl.flock(shard.lock_file, fcntl.LOCK_UN)
+                shard.lock_file.close()
+                shard.lock_file = None
+
+
+@contextmanager
+def workspace_lock(workspace=DEFAULT_WORKSPACE):
+    """Hold a workspace's write lock, e.g. around a load-modify-save.
+
+    The lock is held across threads and processes.
+    """
+    workspace = validate_workspace(workspace)
+    with _locked(_shard(workspace), workspace):
+        yield
+
+
+def load_calculations(workspace=DEFAULT_WORKSPACE):
+    """Load saved calculations.
+
+    The parsed file is cached per workspace and re-read only when the file
+    changes on disk. Returns a new list each time, so callers may modify it.
+    """
+    workspace = validate_workspace(workspace)
+    filepath = workspace_path(workspace)
+    shard = _shard(workspace)
+    with shard.lock:
+        stamp = _file_stamp(filepath)
+        if stamp is None:
+            return []
+        if stamp != shard.stamp:
+            try:
+                with open(filepath, "r") as f:
+                    shard.data = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                shard.data = []
+            shard.stamp = stamp
+            shard.version += 1
+        return list(shard.data)
+
+
+def save_calculations(calculations, workspace=DEFAULT_WORKSPACE):
     """Save calculations."""
-    save_json("calculations.json", calculations)
+    workspace = validate_workspace(workspace)
+    filepath = workspace_path(workspace)
+    shard = _shard(workspace)
+    with _locked(shard, workspace):
+        if not os.path.exists(os.path.dirname(filepath)):
+            os.makedirs(os.path.dirname(filepath))
+        write_json(filepath, calculations)
+        shard.data = list(calculations)
+        shard.stamp = _file_stamp(filepath)
+        shard.version += 1
+
+
+def calculations_version(workspace=DEFAULT_WORKSPACE):
+    """A number that changes whenever a workspace's calculations change.
+
+    Picks up writes from other processes too (the file is re-read if it
+    changed on disk).
+    """
+    workspace = validate_workspace(workspace)
+    shard = _shard(workspace)
+    with shard.lock:
+        if _file_stamp(workspace_path(workspace)) != shard.stamp:
+            load_calculations(workspace)
+        return shard.version
+
+
+def apply_change(change, workspace=DEFAULT_WORKSPACE, with_version=False):
+    """Apply change(calculations) to a workspace and save, returning its result.
+
+    change receives the current list of calculations, modifies it in place
+    and may return a value. Writers that arrive within GROUP_COMMIT_WINDOW
+    of each other are coalesced: the first one waits briefly, then loads
+    the file once, applies every queued change in arrival order and writes
+    once. A change that raises does not stop the others and none of its
+    edits are kept; its exception is re-raised in its own caller. Changes
+    must not modify the record dicts in place.
+
+    With with_version, returns (result, version), where version is the
+    calculations_version() the commit produced.
+    """
+    workspace = validate_workspace(workspace)
+    shard = _shard(workspace)
+    entry = _PendingChange(change)
+
+    with shard.queue_lock:
+        shard.pending.append(entry)
+        leader = not shard.leader_waiting
+        if leader:
+            shard.leader_waiting = True
+
+    if leader:
+        time.sleep(GROUP_COMMIT_WINDOW)
+        with shard.queue_lock:
+            batch = shard.pending
+            shard.pending = []
+            shard.leader_waiting = False
+        _commit(batch, workspace, shard)
+    else:
+        entry.done.wait()
+
+    if entry.error is not None:
+        raise entry.error
+    if with_version:
+        return entry.result, entry.version
+    return entry.result
+
+
+def _commit(batch, workspace, shard):
+    try:
+        with _locked(shard, workspace):
+            calculations = load_calculations(workspace)
+            applied = False
+            for entry in batch:
+                # Each change works on its own copy, so one that fails
+                # halfway leaves nothing behind
+                working = list(calculations)
+                try:
+                    entry.result = entry.change(working)
+                except Exception as e:
+                    entry.error = e
+                    continue
+                calculations = working
+                applied = True
+            if applied:
+                save_calculations(calculations, workspace)
+            for entry in batch:
+                entry.version = shard.version
+    except Exception as e:
+        for entry in batch:
+            if entry.error is None:
+                entry.error = e
+    finally:
+        for entry in batch:
+            entry.done.set()
+
+
+def add_calculations(calculations, records):
+    """Append records, folding exact duplicates into the existing record.
+
+    Records are identified by calculator.content_hash() over their inputs,
+    stored on the record as content_hash. Records saved before that get
+    their hash written on here, so each is hashed only once. A duplicate
+    bumps the existing record's save_count instead of adding a row. Returns
+    the records that were added as new rows.
+    """
+    index = {}
+    for i, calc in enumerate(calculations):
+        key = calc.get("content_hash")
+        if not key:
+            key = content_hash(calc)
+            calculations[i] = dict(calc, content_hash=key)
+        index[key] = i
+
+    added = []
+    for record in records:
+        key = record.get("content_hash") or content_hash(record)
+        existing = index.get(key)
+        if existing is None:
+            index[key] = len(calculations)
+            calculations.append(dict(record, content_hash=key))
+            added.append(calculations[-1])
+        else:
+            previous = calculations[existing]
+            count = previous.get("save_count", 1) + record.get("save_count", 1)
+            calculations[existing] = dict(previous, save_count=count)
+    return added
+
+
+def save_calculation(record, workspace=DEFAULT_WORKSPACE):
+    """Save one calculation, deduplicated. Returns True if it was a duplicate."""
+    return not apply_change(lambda calculations: add_calculations(calculations, [record]), workspace)
+
+
+def duplicate_count(calculations):
+    """How many saves were folded into existing records."""
+    return sum(calc.get("save_count", 1) - 1 for calc in calculations)
+
+
+def dedupe_calculations(workspace=DEFAULT_WORKSPACE):
+    """Fold duplicates already in a workspace's file. Returns rows removed."""
+    def compact(calculations):
+        original = list(calculations)
+        del calculations[:]
+        return len(original) - len(add_calculations(calculations, original))
+    return apply_change(compact, workspace)
+
+
+def job_result_path(job_id):
+    """Path of the stored result for a background job."""
+    return os.path.join(DATA_DIR, "jobs", "%s.json" % job_id)
+
+
+def save_job_result(job_id, result):
+    """Save the result of a background job."""
+    filepath = job_result_path(job_id)
+    if not os.path.exists(os.path.dirname(filepath)):
+        os.makedirs(os.path.dirname(filepath))
+
+    with open(filepath, "w") as f:
+        json.dump(result, f, default=str)
+
+
+def load_job_result(job_id):
+    """Load the result of a background job, or None if there is none."""
+    filepath = job_result_path(job_id)
+
+    if not os.path.exists(filepath):
+        return None
+
+    try:
+        with open(filepath, "r") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return None
+
+
+def job_status_path(job_id):
+    """Path of the stored status of a background job."""
+    return os.path.join(DATA_DIR, "jobs", "%s.status.json" % job_id)
+
+
+def save_job_status(job_id, status):
+    """Save a job's status, so every worker process can report it."""
+    filepath = job_status_path(job_id)
+    if not os.path.exists(os.path.dirname(filepath)):
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    write_json(filepath, status)
+
+
+def load_job_status(job_id):
+    """Load a job's stored status, or None if there is none."""
+    filepath = job_status_path(job_id)
+    try:
+        with open(filepath, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def list_job_statuses():
+    """Stored statuses of all jobs."""
+    jobs_dir = os.path.join(DATA_DIR, "jobs")
+    if not os.path.isdir(jobs_dir):
+        return []
+    statuses = []
+    for filename in os.listdir(jobs_dir):
+        if filename.endswith(".status.json"):
+            status = load_job_status(filename[:-len(".status.json")])
+            if status is not None:
+                statuses.append(status)
+    return statuses
+
+
+def request_job_cancel(job_id):
+    """Leave a cancel request for a job, for whichever process runs it."""
+    filepath = os.path.join(DATA_DIR, "jobs", "%s.cancel" % job_id)
+    if not os.path.exists(os.path.dirname(filepath)):
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    open(filepath, "a").close()
+
+
+def job_cancel_requested(job_id):
+    return os.path.exists(os.path.join(DATA_DIR, "jobs", "%s.cancel" % job_id))
+
+
+def delete_job(job_id):
+    """Remove everything stored for a job: status, result and cancel request."""
+    for filepath in (job_status_path(job_id), job_result_path(job_id),
+                     os.path.join(DATA_DIR, "jobs", "%s.cancel" % job_id)):
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
 
 
 def generate_id():
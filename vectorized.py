@@ -0,0 +1,78 @@
+"""
+Vectorized calculator math - BusinessCalculator metrics over many records at once.
+"""
+
+import numpy as np
+
+from calculator import FIXED_COST_FIELDS, VARIABLE_COST_FIELDS, INPUT_FIELDS
+
+# Same defaults BusinessCalculator.__init__ uses for missing fields
+DEFAULTS = {field: 0.0 for field in INPUT_FIELDS}
+DEFAULTS["units"] = 1.0
+
+
+def to_arrays(records):
+    """Turn a list of calculation dicts into a dict of float arrays, one per input field."""
+    arrays = {}
+    for field in INPUT_FIELDS:
+        default = DEFAULTS[field]
+        values = [r.get(field, default) for r in records]
+        try:
+            column = np.array(values, dtype=float)
+        except (TypeError, ValueError):
+            # Blank values from older saves count as 0, like the form
+            column = np.array([float(v or 0) for v in values], dtype=float)
+        column[np.isnan(column)] = 0
+        arrays[field] = column
+    return arrays
+
+
+def fixed_costs(arrays):
+    """Total fixed costs per record."""
+    return sum(arrays[field] for field in FIXED_COST_FIELDS)
+
+
+def variable_cost_per_unit(arrays):
+    """Variable cost of a single unit per record."""
+    return sum(arrays[field] for field in VARIABLE_COST_FIELDS)
+
+
+def metrics(arrays):
+    """Compute the BusinessCalculator.to_dict() outputs for every record.
+
+    Edge cases follow the scalar properties: cost per unit is 0 when
+    units <= 0 and profit margin is 0 when revenue <= 0.
+    """
+    units = arrays["units"]
+    price = arrays["selling_price"]
+    fixed = fixed_costs(arrays)
+    variable = variable_cost_per_unit(arrays) * units
+    total_costs = fixed + variable
+    cost_per_unit = np.divide(total_costs, units, out=np.zeros_like(total_costs), where=units > 0)
+    revenue = price * units
+    profit = revenue - total_costs
+    # Same operation order as the scalar property, so results match exactly
+    margin = np.divide(profit, revenue, out=np.zeros_like(profit), where=revenue > 0) * 100
+    return {
+        "total_fixed_costs": fixed,
+        "total_variable_costs": variable,
+        "total_costs": total_costs,
+        "cost_per_unit": cost_per_unit,
+        "breakeven_price": cost_per_unit,
+        "total_revenue": revenue,
+        "gross_profit": profit,
+        "profit_margin": margin,
+    }
+
+
+def auto_price(arrays):
+    """Price records with selling_price 0 for their target_margin, like calculator.calculate()."""
+    units = arrays["units"]
+    total_costs = fixed_costs(arrays) + variable_cost_per_unit(arrays) * units
+    cost_per_unit = np.divide(total_costs, units, out=np.zeros_like(total_costs), where=units > 0)
+    margin = arrays["target_margin"]
+    with np.errstate(divide="ignore"):
+        target_price = np.where(margin >= 100, np.inf, cost_per_unit / np.where(margin >= 100, 1, 1 - margin / 100))
+    priced = dict(arrays)
+    priced["selling_price"] = np.where(arrays["selling_price"] == 0, target_price, arrays["selling_price"])
+    return priced